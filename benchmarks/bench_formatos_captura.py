@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gravador_core as core
+import gravador_wav as wavfile
+
+# Compara memória e tempo de escrita entre captura float32, int16 e int32
+DURATION = 60  # Segundos de áudio simulado
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+
+def capture_blocks(dtype):
+    source = core.SyntheticSource(sample_rate=SAMPLE_RATE, channels=CHANNELS, realtime=False,
+                                  blocksize=1024, dtype=dtype)
+    n_blocks = DURATION * SAMPLE_RATE // source.blocksize
+    return [source.read(None) for _ in range(n_blocks)]
+
+
+def main():
+    print(f"{DURATION} s, {SAMPLE_RATE} Hz, {CHANNELS} canais")
+    print(f"{'formato':>8} {'RAM (MB)':>9} {'pico save (MB)':>15} {'save (ms)':>10} {'WAV (MB)':>9}")
+    with tempfile.TemporaryDirectory() as folder:
+        for dtype in ("float32", "int16", "int32"):
+            frames = capture_blocks(dtype)
+            ram = sum(block.nbytes for block in frames) / 1e6
+            filepath = os.path.join(folder, f"{dtype}.wav")
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            wavfile.save_wav(filepath, frames, SAMPLE_RATE, CHANNELS)
+            elapsed = (time.perf_counter() - start) * 1000
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+
+            size = os.path.getsize(filepath) / 1e6
+            print(f"{dtype:>8} {ram:9.1f} {peak:15.2f} {elapsed:10.1f} {size:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
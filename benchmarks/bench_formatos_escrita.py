@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gravador_core as core
+import gravador_wav as wavfile
+
+# Débito de escrita de cada formato de ficheiro a partir de cada formato de captura
+DURATION = 60  # Segundos de áudio simulado
+SAMPLE_RATE = 48000
+CHANNELS = 2
+REPEAT = 3  # Usa-se o melhor de várias escritas
+
+
+def capture_blocks(dtype):
+    source = core.SyntheticSource(sample_rate=SAMPLE_RATE, channels=CHANNELS, realtime=False,
+                                  blocksize=1024, dtype=dtype)
+    n_blocks = DURATION * SAMPLE_RATE // source.blocksize
+    return [source.read(None) for _ in range(n_blocks)]
+
+
+def main():
+    print(f"{DURATION} s, {SAMPLE_RATE} Hz, {CHANNELS} canais (melhor de {REPEAT})")
+    print(f"{'captura':>8} {'ficheiro':>8} {'save (ms)':>10} {'WAV (MB)':>9} {'MB/s':>8} {'x tempo real':>13}")
+    with tempfile.TemporaryDirectory() as folder:
+        for dtype in ("float32", "int16", "int32"):
+            frames = capture_blocks(dtype)
+            for sample_format in wavfile.FILE_FORMATS:
+                filepath = os.path.join(folder, f"{dtype}-{sample_format}.wav")
+                best = float("inf")
+                for _ in range(REPEAT):
+                    start = time.perf_counter()
+                    wavfile.save_wav(filepath, frames, SAMPLE_RATE, CHANNELS, sample_format)
+                    best = min(best, time.perf_counter() - start)
+                size = os.path.getsize(filepath) / 1e6
+                print(f"{dtype:>8} {sample_format:>8} {best * 1000:10.1f} {size:9.1f} "
+                      f"{size / best:8.0f} {DURATION / best:13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1328 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+import os
+import sys
+import argparse
+import queue
+import threading
+from pathlib import Path
+
+import gravador_batch as batch
+import gravador_catalog as catalog
+import gravador_core as core
+import gravador_devices as devices
+import gravador_edits as editing
+import gravador_export as export
+import gravador_peaks as peaks
+import gravador_wav as wavfile
+import gravador_agenda as agenda
+import gravador_api as api
+import gravador_stream as stream
+import gravador_spectrogram as spectrogram
+import gravador_view as view
+
+# Configurações iniciais
+sample_rate = 44100  # Taxa de amostragem em Hz
+pcm_fanout = None  # Saída PCM em tempo real para clientes locais (--pcm-port/--pcm-socket)
+cli_exporter = None  # Exportação em segundo plano na linha de comando (--export)
+
+# Fontes de captura disponíveis na interface
+BACKENDS = {
+    "Sistema (soundcard)": "soundcard",
+    "Microfone (sounddevice)": "sounddevice",
+    "Sintético (teste)": "synthetic",
+}
+
+# Perfis de latência disponíveis na interface
+PROFILES = {
+    "Equilibrado": "balanced",
+    "Baixa latência (monitorização)": "low",
+    "Economia de energia (blocos grandes)": "power-saving",
+    "Automático (testar dispositivo)": core.AUTO_PROFILE,
+}
+
+# Formatos de captura: int16/int32 são guardados e escritos sem conversão
+CAPTURE_FORMATS = {
+    "16 bits (int16)": "int16",
+    "24/32 bits (int32)": "int32",
+    "Float (32 bits)": "float32",
+}
+
+# Formatos do ficheiro WAV; None escreve no formato da captura (float vai para 16 bits)
+FILE_FORMATS = {
+    "Igual à captura": None,
+    "PCM 16 bits": "int16",
+    "PCM 24 bits": "int24",
+    "PCM 32 bits": "int32",
+    "Float 32 bits": "float32",
+}
+
+# Cópias exportadas depois de salvar cada gravação (num pool de processos)
+EXPORT_LABELS = {
+    "PCM 16 bits": "wav16",
+    "FLAC": "flac",
+    "Prévia 16 kHz": "preview",
+}
+
+# Entrada da lista de dispositivos que usa o dispositivo padrão do sistema
+DEFAULT_DEVICE = "Padrão do sistema"
+
+class AudioRecorderGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Gravador de Som do Sistema")
+        self.root.geometry("800x600")
+        self.recorder = None
+        self.level_meter = core.LevelMeter()
+        self.spectrum = view.SpectrumAnalyzer()
+        self.spectrum_window = None
+        self.spectrum_view = None
+        self.server = None
+        self.scheduled_job_done = None  # Evento da gravação agendada em curso
+        self.tuning = None  # Ações à espera da medição da latência do perfil "auto", se está a correr
+        self.device_registry = None
+        self.device_ids = {DEFAULT_DEVICE: None}  # Texto na lista -> id estável do dispositivo
+        self.exporter = export.Exporter(
+            on_progress=lambda *progress: self.root.after(0, self.update_export_progress, *progress))
+        self.export_progress = {}  # (ficheiro, formato) -> fração exportada
+        self.edit_file = None  # Ficheiro mostrado no gráfico, alvo das edições
+        self.edits = None
+        self.loaded_spectrogram = None  # (ficheiro, Spectrogram) do último espectrograma calculado
+        self.scheduler = agenda.Scheduler(self.run_scheduled_job,
+                                          on_change=lambda: self.root.after(0, self.refresh_schedule))
+        self.setup_gui()
+        self.select_backend()
+        self.scheduler.start()
+        self.reconcile_catalog()
+
+    def setup_gui(self):
+        # Frame principal
+        self.main_frame = ttk.Frame(self.root, padding="10")
+        self.main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Frame para controles de arquivo
+        self.file_frame = ttk.LabelFrame(self.main_frame, text="Configurações de Arquivo", padding="5")
+        self.file_frame.pack(fill=tk.X, pady=(0, 10))
+
+        # Campo de caminho do arquivo
+        self.path_frame = ttk.Frame(self.file_frame)
+        self.path_frame.pack(fill=tk.X, pady=5)
+
+        self.path_var = tk.StringVar()
+        self.path_var.set(str(Path.home() / "Gravações"))  # Pasta padrão
+
+        ttk.Label(self.path_frame, text="Pasta de destino:").pack(side=tk.LEFT)
+        self.path_entry = ttk.Entry(self.path_frame, textvariable=self.path_var)
+        self.path_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        self.browse_button = ttk.Button(self.path_frame, text="Procurar", command=self.select_folder)
+        self.browse_button.pack(side=tk.LEFT)
+
+        ttk.Label(self.path_frame, text="Ficheiro:").pack(side=tk.LEFT, padx=(10, 0))
+        self.file_format_var = tk.StringVar(value=next(iter(FILE_FORMATS)))
+        self.file_format_combo = ttk.Combobox(self.path_frame, textvariable=self.file_format_var,
+                                              values=list(FILE_FORMATS), state="readonly", width=16)
+        self.file_format_combo.pack(side=tk.LEFT, padx=5)
+
+        # Seleção da fonte de captura
+        self.source_frame = ttk.Frame(self.file_frame)
+        self.source_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(self.source_frame, text="Fonte:").pack(side=tk.LEFT)
+        self.backend_var = tk.StringVar(value=next(iter(BACKENDS)))
+        self.backend_combo = ttk.Combobox(self.source_frame, textvariable=self.backend_var,
+                                          values=list(BACKENDS), state="readonly")
+        self.backend_combo.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(self.source_frame, text="Latência:").pack(side=tk.LEFT, padx=(10, 0))
+        self.profile_var = tk.StringVar(value=next(iter(PROFILES)))
+        self.profile_combo = ttk.Combobox(self.source_frame, textvariable=self.profile_var,
+                                          values=list(PROFILES), state="readonly", width=34)
+        self.profile_combo.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(self.source_frame, text="Formato:").pack(side=tk.LEFT, padx=(10, 0))
+        self.format_var = tk.StringVar(value=next(iter(CAPTURE_FORMATS)))
+        self.format_combo = ttk.Combobox(self.source_frame, textvariable=self.format_var,
+                                         values=list(CAPTURE_FORMATS), state="readonly", width=28)
+        self.format_combo.pack(side=tk.LEFT, padx=5)
+
+        # Dispositivo de captura: lista em cache, atualizada quando se liga ou desliga um dispositivo
+        self.device_frame = ttk.Frame(self.file_frame)
+        self.device_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(self.device_frame, text="Dispositivo:").pack(side=tk.LEFT)
+        self.device_var = tk.StringVar(value=DEFAULT_DEVICE)
+        self.device_combo = ttk.Combobox(self.device_frame, textvariable=self.device_var,
+                                         values=list(self.device_ids), state="readonly")
+        self.device_combo.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.rescan_button = ttk.Button(self.device_frame, text="Atualizar", command=self.rescan_devices)
+        self.rescan_button.pack(side=tk.LEFT)
+
+        # Limite de RAM da gravação: acima dele os blocos mais antigos vão para disco
+        ttk.Label(self.device_frame, text="RAM máx. (MB, 0 = sem limite):").pack(side=tk.LEFT, padx=(10, 0))
+        self.memory_limit_var = tk.DoubleVar(value=0)
+        ttk.Spinbox(self.device_frame, from_=0, to=100000, increment=100,
+                    textvariable=self.memory_limit_var, width=7).pack(side=tk.LEFT, padx=5)
+        self.backend_combo.bind("<<ComboboxSelected>>", lambda event: self.select_backend())
+
+        # Standby: o stream fica aberto e guarda os últimos segundos (0 = descarta,
+        # só para a gravação começar sem esperar pela abertura do dispositivo)
+        self.standby_frame = ttk.Frame(self.file_frame)
+        self.standby_frame.pack(fill=tk.X, pady=5)
+
+        self.standby_var = tk.BooleanVar(value=False)
+        self.standby_check = ttk.Checkbutton(self.standby_frame, text="Standby, pré-gravação (s):",
+                                             variable=self.standby_var, command=self.toggle_standby)
+        self.standby_check.pack(side=tk.LEFT)
+        self.preroll_var = tk.DoubleVar(value=5.0)
+        self.preroll_spin = ttk.Spinbox(self.standby_frame, from_=0, to=60, increment=1,
+                                        textvariable=self.preroll_var, width=5)
+        self.preroll_spin.pack(side=tk.LEFT, padx=5)
+
+        # Disparo por nível: cada evento acima do limiar gera um novo ficheiro
+        self.trigger = None
+        self.trigger_var = tk.BooleanVar(value=False)
+        self.trigger_check = ttk.Checkbutton(self.standby_frame, text="Disparo por nível (dBFS):",
+                                             variable=self.trigger_var, command=self.toggle_trigger)
+        self.trigger_check.pack(side=tk.LEFT, padx=(10, 0))
+        self.threshold_var = tk.DoubleVar(value=-30.0)
+        ttk.Spinbox(self.standby_frame, from_=-90, to=0, increment=1,
+                    textvariable=self.threshold_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(self.standby_frame, text="Silêncio (s):").pack(side=tk.LEFT)
+        self.hold_var = tk.DoubleVar(value=2.0)
+        ttk.Spinbox(self.standby_frame, from_=0.1, to=60, increment=0.5,
+                    textvariable=self.hold_var, width=5).pack(side=tk.LEFT, padx=5)
+
+        # Amostras perdidas pelo dispositivo: silêncio no lugar delas (duração fiel ao relógio)
+        self.fill_gaps_var = tk.BooleanVar(value=False)
+        self.fill_gaps_check = ttk.Checkbutton(self.standby_frame, text="Preencher falhas com silêncio",
+                                               variable=self.fill_gaps_var)
+        self.fill_gaps_check.pack(side=tk.LEFT, padx=(10, 0))
+
+        # Limitador com look-ahead e AGC no caminho de captura
+        self.limiter_frame = ttk.Frame(self.file_frame)
+        self.limiter_frame.pack(fill=tk.X, pady=5)
+
+        self.limiter_var = tk.BooleanVar(value=False)
+        self.limiter_check = ttk.Checkbutton(self.limiter_frame, text="Limitador, teto (dBFS):",
+                                             variable=self.limiter_var)
+        self.limiter_check.pack(side=tk.LEFT)
+        self.ceiling_var = tk.DoubleVar(value=-1.0)
+        self.ceiling_spin = ttk.Spinbox(self.limiter_frame, from_=-20, to=0, increment=0.5,
+                                        textvariable=self.ceiling_var, width=5)
+        self.ceiling_spin.pack(side=tk.LEFT, padx=5)
+        self.agc_var = tk.BooleanVar(value=False)
+        self.agc_check = ttk.Checkbutton(self.limiter_frame, text="AGC, nível alvo (dBFS):",
+                                         variable=self.agc_var)
+        self.agc_check.pack(side=tk.LEFT, padx=(10, 0))
+        self.agc_target_var = tk.DoubleVar(value=-18.0)
+        self.agc_spin = ttk.Spinbox(self.limiter_frame, from_=-40, to=-6, increment=1,
+                                    textvariable=self.agc_target_var, width=5)
+        self.agc_spin.pack(side=tk.LEFT, padx=5)
+
+        # Exportação: cópias noutros formatos, feitas em paralelo sem bloquear a gravação
+        self.export_frame = ttk.Frame(self.file_frame)
+        self.export_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(self.export_frame, text="Exportar:").pack(side=tk.LEFT)
+        self.export_vars = {}
+        for label, name in EXPORT_LABELS.items():
+            self.export_vars[name] = tk.BooleanVar(value=False)
+            ttk.Checkbutton(self.export_frame, text=label, variable=self.export_vars[name]).pack(side=tk.LEFT, padx=5)
+        self.export_bar = ttk.Progressbar(self.export_frame, length=150, mode='determinate')
+        self.export_bar.pack(side=tk.LEFT, padx=(10, 5))
+        self.export_status_var = tk.StringVar()
+        ttk.Label(self.export_frame, textvariable=self.export_status_var).pack(side=tk.LEFT)
+
+        # Frame para controles de gravação
+        self.control_frame = ttk.LabelFrame(self.main_frame, text="Controles", padding="5")
+        self.control_frame.pack(fill=tk.X, pady=(0, 10))
+
+        # Botões
+        self.button_frame = ttk.Frame(self.control_frame)
+        self.button_frame.pack(fill=tk.X, pady=5)
+
+        self.record_button = ttk.Button(self.button_frame, text="Gravar", command=self.start_recording)
+        self.record_button.pack(side=tk.LEFT, padx=5)
+
+        self.pause_button = ttk.Button(self.button_frame, text="Pausar", command=self.pause_recording, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+
+        self.stop_button = ttk.Button(self.button_frame, text="Parar", command=self.stop_recording, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=5)
+
+        self.spectrum_button = ttk.Button(self.button_frame, text="Espectro", command=self.open_spectrum)
+        self.spectrum_button.pack(side=tk.LEFT, padx=(20, 5))
+
+        # Status
+        self.status_var = tk.StringVar(value="Status: Pronto")
+        self.status_label = ttk.Label(self.control_frame, textvariable=self.status_var)
+        self.status_label.pack(fill=tk.X, pady=5)
+
+        # Agendamento de gravações com duração exata
+        self.schedule_frame = ttk.LabelFrame(self.main_frame, text="Agendamento", padding="5")
+        self.schedule_frame.pack(fill=tk.X, pady=(0, 10))
+
+        self.schedule_form = ttk.Frame(self.schedule_frame)
+        self.schedule_form.pack(fill=tk.X)
+
+        ttk.Label(self.schedule_form, text="Início (HH:MM):").pack(side=tk.LEFT)
+        self.schedule_start_var = tk.StringVar(value="08:00")
+        ttk.Entry(self.schedule_form, textvariable=self.schedule_start_var, width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Label(self.schedule_form, text="Duração (s):").pack(side=tk.LEFT)
+        self.schedule_duration_var = tk.DoubleVar(value=60.0)
+        ttk.Entry(self.schedule_form, textvariable=self.schedule_duration_var, width=8).pack(side=tk.LEFT, padx=5)
+        self.schedule_daily_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.schedule_form, text="Diária", variable=self.schedule_daily_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.schedule_form, text="Agendar", command=self.add_schedule).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.schedule_form, text="Cancelar", command=self.cancel_schedule).pack(side=tk.LEFT)
+
+        self.schedule_list = tk.Listbox(self.schedule_frame, height=3)
+        self.schedule_list.pack(fill=tk.X, pady=5)
+
+        # Barra de som
+        self.volume_bar = ttk.Progressbar(self.control_frame, orient='horizontal', length=300, mode='determinate')
+        self.volume_bar.pack(pady=10)
+        self.volume_label = ttk.Label(self.control_frame, text="Volume")
+        self.volume_label.pack()
+
+        # Frame para o gráfico
+        self.graph_frame = ttk.Frame(self.main_frame)
+        self.graph_frame.pack(fill=tk.BOTH, expand=True)
+        self.edit_frame = ttk.Frame(self.graph_frame)
+        self.edit_frame.pack(fill=tk.X)
+        self.overlay_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.edit_frame, text="Sobrepor canais", variable=self.overlay_var,
+                        command=self.toggle_overlay).pack(side=tk.LEFT)
+        self.spectrogram_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.edit_frame, text="Espectrograma", variable=self.spectrogram_var,
+                        command=self.toggle_spectrogram).pack(side=tk.LEFT, padx=(10, 0))
+
+        # Edição não destrutiva do trecho selecionado no gráfico (arrastar com o rato)
+        ttk.Button(self.edit_frame, text="Aparar", command=lambda: self.apply_edit("trim")).pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Button(self.edit_frame, text="Cortar", command=lambda: self.apply_edit("cut")).pack(side=tk.LEFT, padx=2)
+        self.gain_var = tk.DoubleVar(value=-6.0)
+        ttk.Spinbox(self.edit_frame, from_=-40, to=20, increment=1,
+                    textvariable=self.gain_var, width=5).pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Button(self.edit_frame, text="Ganho (dB)", command=lambda: self.apply_edit("gain")).pack(side=tk.LEFT, padx=2)
+        ttk.Button(self.edit_frame, text="Desfazer", command=self.undo_edit).pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Button(self.edit_frame, text="Exportar edição", command=self.render_edits).pack(side=tk.LEFT, padx=2)
+        self.waveform = view.WaveformView(self.graph_frame)
+
+        # Criar pasta padrão se não existir
+        os.makedirs(self.path_var.get(), exist_ok=True)
+
+    @property
+    def is_recording(self):
+        return self.recorder is not None and self.recorder.is_recording
+
+    def select_folder(self):
+        try:
+            folder = filedialog.askdirectory(
+                parent=self.root,
+                initialdir=self.path_var.get(),
+                title='Selecione a pasta para salvar as gravações'
+            )
+            if folder:
+                self.path_var.set(folder)
+                os.makedirs(folder, exist_ok=True)
+                self.reconcile_catalog()
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao selecionar pasta: {str(e)}")
+
+    # Cria o gravador com a fonte, latência, formato e pré-gravação escolhidos.
+    # Um gravador com o stream aberto (em espera ou a gravar) nunca é substituído.
+    def create_recorder(self):
+        if self.recorder is not None and self.recorder.state != core.IDLE:
+            raise RuntimeError("A gravação já está em andamento")
+        backend, options = self.source_settings()
+        source = core.create_source(backend, sample_rate=sample_rate, profile=PROFILES[self.profile_var.get()],
+                                    **options)
+        preroll = self.preroll_var.get() if self.standby_var.get() else 0.0
+        memory_limit = int(self.memory_limit_var.get() * 1e6) or None
+        limiter = None
+        if self.limiter_var.get() or self.agc_var.get():
+            limiter = core.Limiter(source.sample_rate, source.channels,
+                                   ceiling_db=self.ceiling_var.get() if self.limiter_var.get() else 0.0,
+                                   agc_target_db=self.agc_target_var.get() if self.agc_var.get() else None)
+        self.recorder = core.Recorder(source, on_error=self.on_recording_error, preroll=preroll,
+                                      fill_gaps=self.fill_gaps_var.get(), memory_limit=memory_limit,
+                                      spill_folder=self.path_var.get(), limiter=limiter)
+        self.level_meter.limiter = limiter
+        self.level_meter.reset()
+        self.recorder.monitors.append(self.level_meter)
+        self.recorder.monitors.append(self.update_volume_bar)
+        self.spectrum.reset(self.recorder.sample_rate)
+        self.recorder.monitors.append(self.spectrum)
+        if self.spectrum_view is not None:
+            self.spectrum_view.ax.set_xlim(20, self.recorder.sample_rate / 2)
+        if pcm_fanout is not None:
+            pcm_fanout.attach(self.recorder)
+        return self.recorder
+
+    # Backend e opções da fonte escolhida (dispositivo e formato)
+    def source_settings(self):
+        options = self.device_registry.source_options(self.device_ids.get(self.device_var.get()))
+        return BACKENDS[self.backend_var.get()], dict(options, dtype=CAPTURE_FORMATS[self.format_var.get()])
+
+    # O perfil "auto" mede a latência abrindo o dispositivo várias vezes, o que
+    # demora alguns segundos: a medição corre numa thread e `then` é chamado na
+    # thread do Tk quando o resultado está em cache. Devolve True se já estava
+    # (ou se o perfil não é "auto") e a ação pode continuar já.
+    def tune_latency(self, then):
+        if PROFILES[self.profile_var.get()] != core.AUTO_PROFILE:
+            return True
+        try:
+            backend, options = self.source_settings()
+        except ValueError:
+            return True  # Dispositivo desligado: o erro aparece ao criar o gravador
+        if core.tuned_blocksize(backend, sample_rate, **options) is not None:
+            return True
+        if self.tuning is not None:
+            self.tuning.append(then)
+            return False
+        self.tuning = [then]
+        self.status_var.set("Status: A ajustar latência...")
+        for widget in (self.record_button, self.standby_check, self.trigger_check):
+            widget.config(state=tk.DISABLED)
+
+        def tune():
+            try:
+                core.auto_tune_blocksize(backend, sample_rate, **options)
+            finally:
+                self.root.after(0, finish)
+
+        def finish():
+            waiting, self.tuning = self.tuning, None
+            self.record_button.config(state=tk.DISABLED if self.trigger is not None else tk.NORMAL)
+            self.standby_check.config(state=tk.NORMAL)
+            self.trigger_check.config(state=tk.NORMAL)
+            for action in waiting:
+                action()
+
+        threading.Thread(target=tune, daemon=True).start()
+        return False
+
+    # Troca o registo de dispositivos quando muda a fonte; cada backend só é
+    # enumerado uma vez e depois verificado em segundo plano
+    def select_backend(self):
+        if self.device_registry is not None:
+            self.device_registry.listeners.remove(self.on_devices_changed)
+            self.device_registry.stop()
+        self.device_registry = devices.registry_for(BACKENDS[self.backend_var.get()])
+        self.device_registry.listeners.append(self.on_devices_changed)
+        self.device_registry.start()
+        self.refresh_devices()
+
+    # Chamado na thread de verificação do registo
+    def on_devices_changed(self):
+        self.root.after(0, self.refresh_devices)
+
+    # Procura dispositivos a pedido (com sounddevice reinicializa o PortAudio,
+    # o que a verificação periódica não faz), numa thread
+    def rescan_devices(self):
+        registry = self.device_registry
+
+        def rescan():
+            try:
+                registry.refresh()
+            except Exception as e:
+                self.root.after(0, self.status_var.set, f"Status: Erro ao procurar dispositivos: {str(e)}")
+
+        threading.Thread(target=rescan, daemon=True).start()
+
+    def refresh_devices(self):
+        try:
+            found = self.device_registry.devices
+        except Exception:
+            found = []  # Backend não instalado: só o dispositivo padrão
+        self.device_ids = {DEFAULT_DEVICE: None}
+        for device in found:
+            label = device.label if device.label not in self.device_ids else f"{device.label} [{device.id}]"
+            self.device_ids[label] = device.id
+        self.device_combo.config(values=list(self.device_ids))
+        if self.device_var.get() not in self.device_ids:
+            self.device_var.set(DEFAULT_DEVICE)
+            if not self.is_recording:
+                self.status_var.set("Status: Dispositivo desligado, a usar o padrão do sistema")
+
+    def set_source_options_state(self, state):
+        for widget in (self.backend_combo, self.profile_combo, self.format_combo, self.device_combo):
+            widget.config(state=state)
+        for widget in (self.rescan_button, self.preroll_spin, self.limiter_check, self.ceiling_spin, self.agc_check, self.agc_spin):
+            widget.config(state=tk.DISABLED if state == tk.DISABLED else tk.NORMAL)
+
+    def toggle_standby(self):
+        if self.standby_var.get() and not self.tune_latency(self.toggle_standby):
+            return
+        try:
+            if self.standby_var.get():
+                recorder = self.create_recorder()
+                recorder.arm()
+                self.set_source_options_state(tk.DISABLED)
+                if recorder.preroll > 0:
+                    self.status_var.set(f"Status: Em espera (pré-gravação de {recorder.preroll:g} s, "
+                                        f"{recorder.preroll_buffer.nbytes / 1e6:.1f} MB)")
+                else:
+                    self.status_var.set("Status: Em espera (stream aberto, início imediato)")
+            elif self.recorder is not None:
+                self.stop_trigger()
+                self.recorder.disarm()
+                if not self.is_recording:
+                    self.set_source_options_state("readonly")
+                    self.status_var.set("Status: Pronto")
+        except Exception as e:
+            self.standby_var.set(False)
+            self.set_source_options_state("readonly")
+            messagebox.showerror("Erro", f"Erro ao abrir o dispositivo: {str(e)}")
+
+    def toggle_trigger(self):
+        if not self.trigger_var.get():
+            self.stop_trigger()
+            return
+        if not self.tune_latency(self.toggle_trigger):
+            return
+        if not self.standby_var.get():
+            self.standby_var.set(True)
+            self.toggle_standby()
+        if self.recorder is None or not self.recorder.armed:
+            self.trigger_var.set(False)
+            return
+        try:
+            self.trigger = core.LevelTrigger(
+                self.recorder, threshold_db=float(self.threshold_var.get()), hold=float(self.hold_var.get()),
+                on_take=lambda *take: self.root.after(0, self.save_take, *take),
+                on_start=lambda: self.root.after(0, self.show_trigger_recording))
+        except (ValueError, tk.TclError) as e:
+            self.trigger_var.set(False)
+            messagebox.showerror("Erro", f"Parâmetros de disparo inválidos: {str(e)}")
+            return
+        # Com o disparo armado as gravações começam pelo nível, não pelo botão
+        self.record_button.config(state=tk.DISABLED)
+        self.status_var.set(f"Status: À espera de sinal acima de {self.trigger.threshold_db:g} dBFS")
+
+    # Desliga o disparo; a gravação que ele começou termina e é salva (save_take)
+    def stop_trigger(self):
+        self.trigger_var.set(False)
+        if self.trigger is not None:
+            self.trigger.detach()
+            self.trigger.finish()
+            self.trigger = None
+        if not self.is_recording:
+            self.record_button.config(state=tk.NORMAL)
+
+    # Uma gravação começada pelo disparo: os botões ficam como numa gravação normal
+    def show_trigger_recording(self):
+        if not self.is_recording:
+            return
+        self.stop_button.config(state=tk.NORMAL)
+        self.pause_button.config(state=tk.NORMAL)
+        self.standby_check.config(state=tk.DISABLED)
+        self.status_var.set("Status: Gravando (disparo por nível)...")
+
+    # Salva uma gravação feita pelo disparo por nível, num ficheiro novo
+    def save_take(self, frames, take_timeline=None, take_stats=None):
+        filepath = None
+        try:
+            filepath = self.save_audio(frames, take_timeline, take_stats)
+            self.plot_waveform(filepath)
+        except Exception as e:
+            filepath = None
+            messagebox.showerror("Erro", f"Erro ao salvar: {str(e)}")
+        finally:
+            # O disparo pode já ter começado a gravação seguinte
+            if not self.is_recording:
+                self.update_ui_after_stop()
+        if filepath:
+            count = self.trigger.takes if self.trigger is not None else 1
+            self.status_var.set(f"Status: Disparo {count} salvo em: {os.path.basename(filepath)}"
+                                + (f" ({take_stats.summary()})" if take_stats is not None else ""))
+
+    # Com o perfil "auto" ainda por medir a gravação começa quando a medição
+    # acabar (devolve True: o pedido foi aceite)
+    def start_recording(self, duration=None):
+        if not self.validate_folder():
+            return False
+        standby = self.recorder is not None and self.recorder.state == core.STANDBY
+        if not standby and not self.tune_latency(lambda: self.start_tuned_recording(duration)):
+            return True
+
+        try:
+            if not standby:
+                self.create_recorder()
+            self.recorder.on_complete = lambda take: self.root.after(0, self.finish_recording, take)
+            self.recorder.start(duration=duration)
+
+            self.record_button.config(state=tk.DISABLED)
+            self.stop_button.config(state=tk.NORMAL)
+            self.pause_button.config(state=tk.NORMAL)
+            self.set_source_options_state(tk.DISABLED)
+            self.standby_check.config(state=tk.DISABLED)
+            self.status_var.set(f"Status: Gravando... (bloco de {self.recorder.source.blocksize} amostras)")
+            self.root.after(100, self.show_start_latency)
+            return True
+
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao iniciar gravação: {str(e)}")
+            return False
+
+    def start_tuned_recording(self, duration):
+        if not self.start_recording(duration):
+            self.release_scheduled_job()
+
+    # Mostra o tempo entre o clique e a primeira amostra gravada, assim que é conhecido
+    def show_start_latency(self):
+        recorder = self.recorder
+        if recorder is None or not recorder.is_recording:
+            return
+        if recorder.start_latency is None:
+            self.root.after(100, self.show_start_latency)
+            return
+        self.status_var.set(f"Status: Gravando... (bloco de {recorder.source.blocksize} amostras, "
+                            f"primeira amostra após {recorder.start_latency * 1000:.0f} ms)")
+
+    def add_schedule(self):
+        try:
+            start = agenda.parse_start_time(self.schedule_start_var.get())
+            duration = float(self.schedule_duration_var.get())
+            if duration <= 0:
+                raise ValueError("a duração deve ser positiva")
+        except (ValueError, tk.TclError) as e:
+            messagebox.showerror("Erro", f"Agendamento inválido: {str(e)}")
+            return
+        self.scheduler.add(agenda.ScheduledJob(start, duration, daily=self.schedule_daily_var.get()))
+
+    def cancel_schedule(self):
+        selection = self.schedule_list.curselection()
+        if selection:
+            jobs = self.scheduler.jobs()
+            if selection[0] < len(jobs):
+                self.scheduler.cancel(jobs[selection[0]])
+
+    def refresh_schedule(self):
+        self.schedule_list.delete(0, tk.END)
+        for job in self.scheduler.jobs():
+            self.schedule_list.insert(tk.END, repr(job))
+
+    # Executado na thread do agendador: inicia a gravação na thread do Tk e
+    # espera que termine antes de passar ao próximo agendamento
+    def run_scheduled_job(self, job):
+        done = threading.Event()
+        self.root.after(0, self.start_scheduled_recording, job, done)
+        done.wait()
+
+    def start_scheduled_recording(self, job, done):
+        if self.is_recording:
+            self.status_var.set(f"Status: Agendamento ignorado (já a gravar): {job!r}")
+            done.set()
+            return
+        self.scheduled_job_done = done
+        if not self.start_recording(duration=job.duration):
+            self.scheduled_job_done = None
+            done.set()
+
+    def validate_folder(self):
+        folder_path = self.path_var.get()
+        try:
+            os.makedirs(folder_path, exist_ok=True)
+            test_file = os.path.join(folder_path, "test_write.tmp")
+            with open(test_file, 'w') as f:
+                f.write("test")
+            os.remove(test_file)
+            return True
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro de acesso à pasta: {str(e)}")
+            return False
+
+    # Chamado pela thread de captura quando o dispositivo falha
+    def on_recording_error(self, error):
+        error_message = f"Erro na gravação: {str(error)}"
+        self.root.after(0, lambda: messagebox.showerror("Erro", error_message))
+        self.root.after(0, self.update_ui_after_stop)
+
+    # Chamado depois do level_meter, que já contou os clips deste bloco
+    def update_volume_bar(self, block):
+        volume = core.block_level(block) * 100
+        meter = self.level_meter
+        text = "Volume"
+        if meter.limiter is not None:
+            text += f" (redução {meter.gain_reduction_db:.1f} dB)"
+        if meter.clips:
+            text += f" - {meter.clips} amostras em clip"
+        self.root.after(0, lambda: (self.volume_bar.config(value=min(volume, 100)),
+                                    self.volume_label.config(text=text)))
+
+    # Analisador de espectro numa janela própria; só calcula enquanto está aberta
+    def open_spectrum(self):
+        if self.spectrum_window is not None:
+            self.spectrum_window.lift()
+            return
+        self.spectrum_window = tk.Toplevel(self.root)
+        self.spectrum_window.title("Espectro")
+        self.spectrum_window.protocol("WM_DELETE_WINDOW", self.close_spectrum)
+        self.spectrum_view = view.SpectrumView(self.spectrum_window, self.spectrum)
+        self.spectrum_view.start()
+
+    def close_spectrum(self):
+        if self.spectrum_window is None:
+            return
+        self.spectrum_view.stop()
+        self.spectrum_window.destroy()
+        self.spectrum_window = None
+        self.spectrum_view = None
+
+    def pause_recording(self):
+        if not self.is_recording:
+            return
+        if self.recorder.toggle_pause():
+            self.pause_button.config(text="Continuar")
+            self.status_var.set("Status: Pausado")
+        else:
+            self.pause_button.config(text="Pausar")
+            self.status_var.set("Status: Gravando...")
+
+    # Só salva se foi esta chamada que terminou a gravação (o disparo ou o fim
+    # da duração podem tê-la terminado ao mesmo tempo e salvam-na eles)
+    def stop_recording(self, notify=True):
+        take = self.recorder.stop_take() if self.is_recording else None
+        if take is not None:
+            return self.finish_recording(take, notify)
+
+    # Salva a gravação terminada pelo botão Parar, pela API ou pelo fim da
+    # duração pedida. take vem de stop_take(): até aqui o gravador armado pode
+    # já ter começado outra gravação (disparo, botão Gravar).
+    def finish_recording(self, take, notify=True):
+        frames, take_timeline, take_stats = take
+        notify = notify and self.scheduled_job_done is None
+        filepath = None
+        try:
+            if frames:
+                filepath = self.save_audio(frames, take_timeline, take_stats)
+                self.plot_waveform(filepath)
+                if notify:
+                    messagebox.showinfo("Sucesso", f"Gravação salva em:\n{filepath}\n\n{take_stats.summary()}")
+        except Exception as e:
+            filepath = None
+            messagebox.showerror("Erro", f"Erro ao salvar: {str(e)}")
+        finally:
+            frames.close()  # Uma gravação vazia não chega a save_take, que a fecharia
+            # O gravador armado pode já estar noutra gravação: os botões ficam
+            if self.is_recording:
+                self.release_scheduled_job()
+            else:
+                self.update_ui_after_stop()
+        if filepath:
+            problems = take_timeline.summary()
+            self.status_var.set(f"Status: Gravação salva em: {os.path.basename(filepath)}"
+                                f" ({take_stats.summary()})"
+                                + (f" ({problems})" if problems else ""))
+        return filepath
+
+    # Servidor de controlo local (API HTTP) a funcionar em paralelo com a interface
+    def start_server(self, port):
+        self.server = api.ControlServer(GuiController(self), port=port).start()
+        self.root.title(f"Gravador de Som do Sistema (API em http://127.0.0.1:{port}, token {self.server.token})")
+        print(f"API em http://127.0.0.1:{port} (token: {self.server.token})")
+
+    def shutdown(self):
+        if self.is_recording:
+            self.stop_recording()
+        if self.server is not None:
+            self.server.stop()
+        if pcm_fanout is not None:
+            pcm_fanout.stop()
+        self.close_spectrum()
+        self.scheduler.stop(wait=False)
+        self.exporter.shutdown(wait=False)
+        devices.stop_all()
+        if self.recorder is not None:
+            self.recorder.disarm()
+        self.root.destroy()
+
+    def update_ui_after_stop(self):
+        self.record_button.config(state=tk.DISABLED if self.trigger is not None else tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.DISABLED)
+        self.pause_button.config(text="Pausar")
+        self.volume_bar['value'] = 0
+        self.standby_check.config(state=tk.NORMAL)
+        self.release_scheduled_job()
+        if self.recorder is not None and self.recorder.state == core.STANDBY:
+            self.status_var.set("Status: Em espera (pré-gravação)")
+            return
+        self.stop_trigger()
+        self.standby_var.set(False)
+        self.set_source_options_state("readonly")
+        self.status_var.set("Status: Pronto")
+
+    # O agendador espera por este evento para passar ao próximo agendamento
+    def release_scheduled_job(self):
+        if self.scheduled_job_done is not None:
+            self.scheduled_job_done.set()
+            self.scheduled_job_done = None
+
+    # Salva uma gravação num ficheiro novo da pasta escolhida; devolve o caminho
+    def save_audio(self, frames, take_timeline=None, take_stats=None):
+        if not frames:
+            frames.close()
+            raise ValueError("Nenhum áudio gravado")
+        return catalog.save_take(self.path_var.get(), frames, self.recorder.sample_rate, self.recorder.channels,
+                                 FILE_FORMATS[self.file_format_var.get()], take_timeline, take_stats,
+                                 self.export_take)
+
+    # Põe o catálogo da pasta em dia numa thread: só lê os WAV novos ou alterados
+    def reconcile_catalog(self):
+        folder = self.path_var.get()
+
+        def reconcile():
+            try:
+                catalog.catalog_for(folder).reconcile()
+            except Exception as e:
+                self.root.after(0, self.status_var.set, f"Status: Erro no catálogo: {str(e)}")
+
+        threading.Thread(target=reconcile, daemon=True).start()
+
+    def export_take(self, filepath):
+        formats = [name for name, var in self.export_vars.items() if var.get()]
+        if not formats:
+            return
+        self.exporter.submit(filepath, formats)
+        for name in formats:
+            self.export_progress[(filepath, name)] = 0.0
+        self.show_export_progress()
+
+    def update_export_progress(self, filepath, name, fraction, error):
+        key = (filepath, name)
+        if key not in self.export_progress:
+            return
+        if error is not None or fraction >= 1.0:
+            del self.export_progress[key]
+        else:
+            self.export_progress[key] = fraction
+        if error is not None:
+            self.status_var.set(f"Status: Erro ao exportar {os.path.basename(filepath)} ({name}): {error}")
+        self.show_export_progress()
+
+    def show_export_progress(self):
+        if self.export_progress:
+            fractions = list(self.export_progress.values())
+            self.export_bar['value'] = 100 * sum(fractions) / len(fractions)
+            self.export_status_var.set(f"{len(fractions)} em curso")
+        else:
+            self.export_bar['value'] = 0
+            self.export_status_var.set("")
+
+    def toggle_overlay(self):
+        self.waveform.set_layout(view.OVERLAID if self.overlay_var.get() else view.STACKED)
+
+    # Sem cache de picos no disco (gravação acabada de salvar) a cache é
+    # construída numa thread; até estar pronta mostra-se uma pré-visualização
+    def plot_waveform(self, filepath):
+        try:
+            self.edits = editing.load_for(filepath, wavfile.read_info(filepath).frames)
+            peak_cache = peaks.PeakCache.load(filepath)
+            if peak_cache is None:
+                data, _ = wavfile.open_wav(filepath)
+                peak_cache = peaks.PeakCache.preview(data)
+                self.build_peaks(filepath, data)
+            self.waveform.show_file(filepath, self.edits, peak_cache)
+            self.edit_file = filepath
+        except Exception as e:
+            self.edit_file = None
+            messagebox.showerror("Erro", f"Erro ao criar gráfico: {str(e)}")
+            return
+        if self.spectrogram_var.get():
+            self.toggle_spectrogram()
+
+    def build_peaks(self, filepath, data):
+        def build():
+            try:
+                peak_cache = peaks.PeakCache.for_file(filepath, data)
+            except Exception as e:
+                self.root.after(0, self.status_var.set, f"Status: Erro na cache de picos: {str(e)}")
+                return
+            self.root.after(0, self.show_peaks, filepath, peak_cache)
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def show_peaks(self, filepath, peak_cache):
+        if self.edit_file == filepath:
+            self.waveform.set_peaks(peak_cache)
+
+    # O espectrograma é calculado numa thread (e em vários processos se o
+    # ficheiro for longo) e fica em cache ao lado do WAV; voltar a ele é imediato
+    def toggle_spectrogram(self):
+        filepath = self.edit_file
+        if not self.spectrogram_var.get() or filepath is None:
+            self.waveform.show_spectrogram(None)
+            return
+        if self.loaded_spectrogram is not None and self.loaded_spectrogram[0] == filepath:
+            self.waveform.show_spectrogram(self.loaded_spectrogram[1])
+            return
+        self.status_var.set("Status: A calcular o espectrograma...")
+
+        def compute():
+            try:
+                result = spectrogram.Spectrogram.for_file(filepath)
+            except Exception as e:
+                self.root.after(0, lambda: messagebox.showerror("Erro", f"Erro no espectrograma: {str(e)}"))
+                return
+            self.root.after(0, self.show_spectrogram, filepath, result)
+
+        threading.Thread(target=compute, daemon=True).start()
+
+    def show_spectrogram(self, filepath, result):
+        self.loaded_spectrogram = (filepath, result)
+        if self.spectrogram_var.get() and self.edit_file == filepath:
+            self.waveform.show_spectrogram(result)
+            self.status_var.set(f"Status: Espectrograma de {os.path.basename(filepath)}")
+
+    # Aplica uma edição ao trecho selecionado; só a lista de edições é gravada
+    def apply_edit(self, kind):
+        selection = self.waveform.selection_frames()
+        if self.edit_file is None or selection is None:
+            messagebox.showinfo("Edição", "Selecione um trecho no gráfico (arrastar com o rato)")
+            return
+        if self.edits is None:
+            self.edits = editing.EditList(self.waveform.source.source_frames)
+        try:
+            if kind == "gain":
+                self.edits.gain(*selection, float(self.gain_var.get()))
+            else:
+                getattr(self.edits, kind)(*selection)
+            editing.save_for(self.edit_file, self.edits)
+        except (ValueError, OSError, tk.TclError) as e:
+            messagebox.showerror("Erro", f"Erro na edição: {str(e)}")
+            return
+        self.waveform.set_edits(self.edits)
+        self.status_var.set(f"Status: Editado ({self.edits.frames / self.waveform.source.sample_rate:.2f} s)")
+
+    def undo_edit(self):
+        if self.edits is None or not self.edits.undo():
+            return
+        editing.save_for(self.edit_file, self.edits)
+        self.waveform.set_edits(self.edits)
+
+    # Exporta o resultado para um ficheiro novo, numa thread; o original não muda
+    def render_edits(self):
+        if self.edits is None or self.edits.is_identity:
+            messagebox.showinfo("Edição", "Não há edições para exportar")
+            return
+        filepath = self.edit_file
+        edits = editing.EditList(self.edits.source_frames, self.edits.segments)
+
+        def report(fraction):
+            self.root.after(0, self.status_var.set, f"Status: A exportar edição... {fraction:.0%}")
+
+        def work():
+            try:
+                target = editing.render(filepath, edits, report=report)
+                self.root.after(0, self.status_var.set, f"Status: Edição exportada em: {os.path.basename(target)}")
+            except Exception as e:
+                self.root.after(0, messagebox.showerror, "Erro", f"Erro ao exportar edição: {str(e)}")
+
+        threading.Thread(target=work, daemon=True).start()
+
+# Controlador da API para a interface: os comandos correm na thread do Tk
+class GuiController:
+    def __init__(self, app):
+        self.app = app
+
+    def call(self, function, timeout=10):
+        done = threading.Event()
+        result = {}
+
+        def run():
+            try:
+                result["value"] = function()
+            except Exception as e:
+                result["error"] = e
+            finally:
+                done.set()
+
+        self.app.root.after(0, run)
+        if not done.wait(timeout):
+            raise RuntimeError("A interface não respondeu")
+        if "error" in result:
+            raise result["error"]
+        return result.get("value")
+
+    def start(self):
+        def start():
+            if self.app.is_recording:
+                raise RuntimeError("A gravação já está em andamento")
+            if not self.app.start_recording():
+                raise RuntimeError("Erro ao iniciar gravação")
+        self.call(start)
+        return self.status()
+
+    def pause(self):
+        def pause():
+            if not self.app.is_recording:
+                raise RuntimeError("Nenhuma gravação em andamento")
+            self.app.pause_recording()
+        self.call(pause)
+        return self.status()
+
+    def stop(self):
+        def stop():
+            if not self.app.is_recording:
+                raise RuntimeError("Nenhuma gravação em andamento")
+            return self.app.stop_recording(notify=False)
+        filepath = self.call(stop)
+        status = self.status()
+        if filepath:
+            status["saved"] = filepath
+        return status
+
+    def status(self):
+        return api.recorder_status(self.app.recorder, self.app.level_meter)
+
+    def list_takes(self):
+        return api.list_takes(self.call(self.app.path_var.get))
+
+# Mostra na consola o fim (ou o erro) de cada exportação
+def print_export_progress(filepath, name, fraction, error):
+    if error is not None:
+        print(f"Erro ao exportar {filepath} ({name}): {error}", file=sys.stderr)
+    elif fraction >= 1.0:
+        print(f"Exportado: {export.export_target(filepath, name)}")
+
+# Envia uma gravação salva para o pool de exportação, sem esperar por ela
+def export_take_cli(args, filepath):
+    global cli_exporter
+    if not args.export:
+        return
+    if cli_exporter is None:
+        cli_exporter = export.Exporter(args.export_workers, on_progress=print_export_progress)
+    cli_exporter.submit(filepath, args.export)
+
+# Salva uma gravação da linha de comando na pasta de saída e exporta-a
+def save_take_cli(args, recorder, frames, take_timeline, take_stats):
+    return catalog.save_take(args.output, frames, recorder.sample_rate, recorder.channels, args.file_format,
+                             take_timeline, take_stats, lambda filepath: export_take_cli(args, filepath))
+
+# Cria o gravador da linha de comando com a fonte escolhida e as saídas ativas
+def create_cli_recorder(args, **options):
+    device_options = devices.registry_for(args.backend).source_options(args.device)
+    source = core.create_source(args.backend, sample_rate=args.sample_rate, profile=args.profile,
+                                dtype=args.dtype, **device_options)
+    memory_limit = int(args.memory_limit * 1e6) if args.memory_limit else None
+    limiter = None
+    if args.limiter is not None or args.agc is not None:
+        limiter = core.Limiter(source.sample_rate, source.channels,
+                               ceiling_db=args.limiter if args.limiter is not None else 0.0,
+                               agc_target_db=args.agc)
+    os.makedirs(args.output, exist_ok=True)
+    recorder = core.Recorder(source, fill_gaps=args.fill_gaps, memory_limit=memory_limit,
+                             spill_folder=args.output, limiter=limiter, **options)
+    if pcm_fanout is not None:
+        pcm_fanout.attach(recorder)
+    return recorder
+
+# Grava uma vez pela linha de comando; com duração o fim é exato em amostras
+def record_take_cli(args, duration=None):
+    recorder = create_cli_recorder(args)
+    print(f"Fonte: {args.backend}, bloco de {recorder.source.blocksize} amostras")
+    recorder.start(duration=duration)
+    try:
+        if not duration:
+            print("Gravando... (Ctrl+C para parar)")
+        recorder.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+    if recorder.error is not None:
+        raise recorder.error
+    filepath = save_take_cli(args, recorder, recorder.frames, recorder.timeline, recorder.stats)
+    print(f"Gravação salva em: {filepath} ({recorder.samples_recorded} amostras, "
+          f"primeira amostra após {(recorder.start_latency or 0) * 1000:.0f} ms)")
+    print(f"Estatísticas: {recorder.stats.summary()}")
+    problems = recorder.timeline.summary()
+    if problems:
+        print(f"Aviso: {problems}", file=sys.stderr)
+    return filepath
+
+# Gravação por nível na linha de comando: um ficheiro por evento, até Ctrl+C
+def trigger_cli(args):
+    recorder = create_cli_recorder(args, preroll=args.pretrigger)
+    takes = queue.Queue()
+    trigger = core.LevelTrigger(recorder, threshold_db=args.trigger, hold=args.hold,
+                                on_take=lambda *take: takes.put(take))
+    os.makedirs(args.output, exist_ok=True)
+    recorder.arm()
+    print(f"À espera de sinal acima de {args.trigger:g} dBFS... (Ctrl+C para sair)")
+    try:
+        while True:
+            try:
+                frames, take_timeline, take_stats = takes.get(timeout=0.5)
+            except queue.Empty:
+                if recorder.error is not None:
+                    raise recorder.error
+                continue
+            filepath = save_take_cli(args, recorder, frames, take_timeline, take_stats)
+            print(f"Disparo {trigger.takes}: {filepath} ({take_stats.summary()})")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        trigger.detach()
+        # Os disparos ainda por salvar e um em curso ao sair também são salvos
+        pending = []
+        while not takes.empty():
+            pending.append(takes.get())
+        take = recorder.stop_take()
+        if take is not None:
+            pending.append(take)
+        recorder.disarm()
+        for frames, take_timeline, take_stats in pending:
+            if frames:
+                print(f"Disparo salvo ao sair: {save_take_cli(args, recorder, frames, take_timeline, take_stats)}")
+            else:
+                frames.close()
+    return 0
+
+# Servidor de controlo sem interface: grava quando recebe /start, até Ctrl+C
+def serve_cli(args):
+    controller = api.CoreController(lambda: create_cli_recorder(args), args.output,
+                                    file_format=args.file_format, standby=args.standby,
+                                    on_saved=lambda filepath: export_take_cli(args, filepath))
+    catalog.catalog_for(args.output).reconcile()
+    if args.standby:
+        controller.prepare()
+    server = api.ControlServer(controller, port=args.port).start()
+    print(f"API em http://127.0.0.1:{args.port} (token: {server.token}, Ctrl+C para sair)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if controller.recorder is not None and controller.recorder.is_recording:
+            print(f"Gravação salva em: {controller.stop().get('saved')}")
+        controller.close()
+        server.stop()
+    return 0
+
+# Lista as gravações da pasta de destino a partir do catálogo (posto em dia antes)
+def list_takes_cli(args):
+    takes_catalog = catalog.catalog_for(args.output)
+    changed, removed = takes_catalog.reconcile()
+    takes = takes_catalog.takes()
+    for take in takes:
+        peak = "—" if take["peak_db"] is None else f"{take['peak_db']:.1f}"
+        rms = "—" if take["rms_db"] is None else f"{take['rms_db']:.1f}"
+        print(f"{take['name']}\t{take['duration']:.1f} s\t{take['format']}\t{take['channels']} canais\t"
+              f"pico {peak} dBFS\tRMS {rms} dBFS")
+    print(f"{len(takes)} gravações ({changed} lidas agora, {removed} removidas do catálogo)")
+    return 0
+
+# Lista os dispositivos de captura do backend com o id a usar em --device
+def list_devices_cli(args):
+    try:
+        found = devices.registry_for(args.backend).devices
+    except Exception as e:
+        print(f"Erro ao listar dispositivos: {e}", file=sys.stderr)
+        return 1
+    for device in found:
+        print(repr(device))
+    return 0
+
+# Lê "início:fim" (segundos) ou "início:fim:dB" das opções de edição
+def parse_edit(kind):
+    def parse(text):
+        values = [float(v) for v in text.split(":")]
+        if len(values) != (3 if kind == "gain" else 2):
+            raise argparse.ArgumentTypeError(f"formato inválido: {text}")
+        return kind, values
+    return parse
+
+# Aplica --trim/--cut/--gain (pela ordem dada, em segundos do resultado) à
+# lista de edições de um WAV; com --render exporta o resultado
+def edit_cli(args):
+    try:
+        info = wavfile.read_info(args.edit)
+        edits = editing.load_for(args.edit, info.frames) or editing.EditList(info.frames)
+        for kind, values in args.edit_ops:
+            start, end = (int(round(v * info.sample_rate)) for v in values[:2])
+            getattr(edits, kind)(start, end, *values[2:])
+        editing.save_for(args.edit, edits)
+        print(f"Edições de {args.edit}: {len(edits.segments)} segmentos, {edits.frames / info.sample_rate:.2f} s")
+        if args.render:
+            print(f"Exportado: {editing.render(args.edit, edits)}")
+    except (OSError, ValueError) as e:
+        print(f"Erro na edição: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+# Processa uma pasta de gravações; um lote interrompido retoma onde parou
+def batch_cli(args):
+    def report(filepath, seconds, error):
+        if error is not None:
+            print(f"Erro em {os.path.basename(filepath)}: {error}", file=sys.stderr)
+        else:
+            print(f"{os.path.basename(filepath)} ({seconds:.1f} s)")
+
+    settings = {"normalize_db": args.normalize_db, "silence_db": args.silence_db,
+                "sample_rate": args.resample_rate}
+    try:
+        result = batch.run_batch(args.batch, args.batch_op, output=args.batch_output, settings=settings,
+                                 workers=args.batch_workers, report=report)
+    except KeyboardInterrupt:
+        print("Lote interrompido; volte a correr o mesmo comando para continuar", file=sys.stderr)
+        return 1
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Erro no lote: {e}", file=sys.stderr)
+        return 1
+    print(result.summary())
+    return 1 if result.failed else 0
+
+# Gravação pela linha de comando, sem interface gráfica
+def record_cli(args):
+    if args.list_devices:
+        return list_devices_cli(args)
+    if args.list_takes:
+        return list_takes_cli(args)
+    if args.edit:
+        return edit_cli(args)
+    if args.batch:
+        return batch_cli(args)
+    if args.serve:
+        return serve_cli(args)
+    if args.at:
+        return schedule_cli(args)
+    if args.trigger is not None:
+        return trigger_cli(args)
+    try:
+        record_take_cli(args, args.duration or None)
+    except Exception as e:
+        print(f"Erro na gravação: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+# Executa as gravações agendadas com --at até não haver mais trabalhos (ou Ctrl+C)
+def schedule_cli(args):
+    if not args.duration:
+        print("Erro: --at exige --duration", file=sys.stderr)
+        return 2
+    finished = threading.Event()
+
+    def on_change():
+        if not scheduler.jobs() and scheduler.current_job is None:
+            finished.set()
+
+    def on_error(job, error):
+        print(f"Erro na gravação agendada {job!r}: {error}", file=sys.stderr)
+
+    scheduler = agenda.Scheduler(lambda job: record_take_cli(args, job.duration),
+                                 on_change=on_change, on_error=on_error)
+    for text in args.at:
+        job = scheduler.add(agenda.ScheduledJob(agenda.parse_start_time(text), args.duration,
+                                                daily=args.daily))
+        print(f"Agendado: {job!r}")
+    scheduler.start()
+    try:
+        finished.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gravador de Som")
+    parser.add_argument("--no-gui", action="store_true", help="gravar pela linha de comando")
+    parser.add_argument("--backend", choices=list(core.BACKENDS), default="soundcard")
+    parser.add_argument("--device", metavar="ID", help="id do dispositivo (ver --list-devices)")
+    parser.add_argument("--list-devices", action="store_true", help="listar os dispositivos e sair")
+    parser.add_argument("--list-takes", action="store_true", help="listar as gravações da pasta de destino e sair")
+    parser.add_argument("--profile", choices=list(core.LATENCY_PROFILES) + [core.AUTO_PROFILE],
+                        default="balanced", help="perfil de latência")
+    parser.add_argument("--dtype", choices=list(core.SAMPLE_FORMATS), default="int16",
+                        help="formato das amostras na captura")
+    parser.add_argument("--file-format", choices=list(wavfile.FILE_FORMATS),
+                        help="formato do WAV (por omissão o da captura; float vai para int16)")
+    parser.add_argument("--fill-gaps", action="store_true",
+                        help="preencher com silêncio as amostras perdidas pelo dispositivo")
+    parser.add_argument("--limiter", type=float, metavar="DBFS",
+                        help="limitador com look-ahead (5 ms) e este teto")
+    parser.add_argument("--agc", type=float, metavar="DBFS",
+                        help="controlo automático de ganho para este nível RMS (com o limitador a 0 dBFS se não houver --limiter)")
+    parser.add_argument("--export", action="append", choices=list(export.EXPORT_FORMATS), default=[],
+                        help="exportar também neste formato (repetível)")
+    parser.add_argument("--export-workers", type=int, default=export.EXPORT_WORKERS,
+                        help="processos de exportação em paralelo")
+    parser.add_argument("--memory-limit", type=float, metavar="MB",
+                        help="RAM máxima da gravação; acima disso os blocos vão para um ficheiro temporário")
+    parser.add_argument("--duration", type=float, default=0, help="duração em segundos (0 = até Ctrl+C)")
+    parser.add_argument("--at", action="append", metavar="HH:MM",
+                        help="agendar uma gravação de --duration segundos (pode repetir)")
+    parser.add_argument("--daily", action="store_true", help="repetir os agendamentos todos os dias")
+    parser.add_argument("--trigger", type=float, metavar="DBFS",
+                        help="gravar por nível: inicia acima deste limiar (ex.: -30)")
+    parser.add_argument("--hold", type=float, default=2.0, help="segundos de silêncio até terminar o disparo")
+    parser.add_argument("--pretrigger", type=float, default=1.0, help="segundos guardados antes do disparo")
+    parser.add_argument("--serve", action="store_true",
+                        help="ativar a API HTTP local (start/pause/stop/status/meter/takes)")
+    parser.add_argument("--standby", action="store_true",
+                        help="com --serve, manter o stream aberto entre gravações (início imediato)")
+    parser.add_argument("--port", type=int, default=api.DEFAULT_PORT, help="porta da API local")
+    parser.add_argument("--pcm-port", type=int, help="publicar o áudio capturado em PCM nesta porta TCP local")
+    parser.add_argument("--pcm-socket", help="publicar o áudio capturado em PCM neste socket Unix")
+    parser.add_argument("--pcm-policy", choices=[stream.DROP_OLDEST, stream.DROP_NEWEST],
+                        default=stream.DROP_OLDEST, help="o que descartar quando um cliente fica para trás")
+    parser.add_argument("--edit", metavar="WAV", help="editar um WAV sem o reescrever (com --trim/--cut/--gain)")
+    parser.add_argument("--trim", dest="edit_ops", action="append", type=parse_edit("trim"), default=[],
+                        metavar="INÍCIO:FIM", help="ficar só com este trecho (segundos)")
+    parser.add_argument("--cut", dest="edit_ops", action="append", type=parse_edit("cut"),
+                        metavar="INÍCIO:FIM", help="remover este trecho (segundos)")
+    parser.add_argument("--gain", dest="edit_ops", action="append", type=parse_edit("gain"),
+                        metavar="INÍCIO:FIM:DB", help="aplicar ganho a este trecho")
+    parser.add_argument("--render", action="store_true", help="com --edit, exportar o resultado para um WAV novo")
+    parser.add_argument("--batch", metavar="PASTA", help="processar todas as gravações de uma pasta e sair")
+    parser.add_argument("--batch-op", action="append", choices=batch.OPERATIONS, default=[],
+                        help="operação do lote (repetível): normalizar, cortar silêncio, reamostrar, FLAC, picos")
+    parser.add_argument("--batch-output", metavar="PASTA", help="pasta dos resultados (por omissão PASTA/processado)")
+    parser.add_argument("--batch-workers", type=int, default=batch.BATCH_WORKERS, help="processos do lote")
+    parser.add_argument("--normalize-db", type=float, default=batch.DEFAULT_SETTINGS["normalize_db"],
+                        help="pico depois de normalizar (dBFS)")
+    parser.add_argument("--silence-db", type=float, default=batch.DEFAULT_SETTINGS["silence_db"],
+                        help="abaixo deste nível o início e o fim contam como silêncio")
+    parser.add_argument("--resample-rate", type=int, metavar="HZ", help="taxa de amostragem da reamostragem")
+    parser.add_argument("--sample-rate", type=int, default=sample_rate)
+    parser.add_argument("--output", default=str(Path.home() / "Gravações"), help="pasta de destino")
+    return parser.parse_args(argv)
+
+def main():
+    global pcm_fanout
+    args = parse_args()
+    if args.pcm_port or args.pcm_socket:
+        pcm_fanout = stream.PcmFanout(port=args.pcm_port or stream.DEFAULT_PORT, unix_path=args.pcm_socket,
+                                      policy=args.pcm_policy).start()
+    if args.no_gui or args.list_devices or args.list_takes or args.edit or args.batch:
+        status = record_cli(args)
+        if cli_exporter is not None:
+            cli_exporter.shutdown(wait=True)
+        if pcm_fanout is not None:
+            pcm_fanout.stop()
+        sys.exit(status)
+    try:
+        root = tk.Tk()
+        app = AudioRecorderGUI(root)
+        if args.serve:
+            app.start_server(args.port)
+
+        def on_closing():
+            if app.is_recording:
+                if messagebox.askyesno("Confirmar", "Uma gravação está em andamento. Deseja sair?"):
+                    app.shutdown()
+            else:
+                app.shutdown()
+
+        root.protocol("WM_DELETE_WINDOW", on_closing)
+        root.mainloop()
+    except Exception as e:
+        messagebox.showerror("Erro", f"Erro ao iniciar aplicação: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+
+# Gravação agendada: começa em `start`, dura `duration` segundos e pode repetir todos os dias
+class ScheduledJob:
+    def __init__(self, start, duration, daily=False, name=None):
+        self.start = start
+        self.duration = duration
+        self.daily = daily
+        self.name = name or f"gravacao_{start:%Y%m%d_%H%M}"
+        self.cancelled = False
+
+    def __repr__(self):
+        repeat = ", diária" if self.daily else ""
+        return f"{self.start:%Y-%m-%d %H:%M:%S} ({self.duration:g} s{repeat})"
+
+    # Próxima ocorrência diária posterior a `now`
+    def advance(self, now):
+        while self.start <= now:
+            self.start += timedelta(days=1)
+
+
+# Função para interpretar "HH:MM" ou "HH:MM:SS" como a próxima ocorrência dessa hora
+def parse_start_time(text, now=None):
+    now = now or datetime.now()
+    parts = [int(part) for part in text.split(":")]
+    if len(parts) == 2:
+        parts.append(0)
+    hour, minute, second = parts
+    start = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if start <= now:
+        start += timedelta(days=1)
+    return start
+
+
+# Fila de gravações agendadas. Uma thread dorme numa Condition até à próxima
+# gravação (ou até a fila mudar) e executa os trabalhos um de cada vez com
+# run_job(job), que deve bloquear até a gravação terminar.
+class Scheduler:
+    def __init__(self, run_job, on_change=None, on_error=None):
+        self.run_job = run_job
+        self.on_change = on_change  # Chamado quando a fila muda
+        self.on_error = on_error  # Chamado com (job, exceção) se uma gravação falhar
+        self._queue = []  # Heap de (início, ordem, job)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.current_job = None
+
+    def add(self, job):
+        with self._condition:
+            heapq.heappush(self._queue, (job.start, next(self._counter), job))
+            self._condition.notify()
+        self._changed()
+        return job
+
+    def cancel(self, job):
+        with self._condition:
+            job.cancelled = True
+            self._queue = [entry for entry in self._queue if entry[2] is not job]
+            heapq.heapify(self._queue)
+            self._condition.notify()
+        self._changed()
+
+    def jobs(self):
+        with self._condition:
+            return [entry[2] for entry in sorted(self._queue)]
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Com wait=False não espera pela gravação em curso (ex.: ao fechar a janela)
+    def stop(self, wait=True):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    if not self._queue:
+                        self._condition.wait()
+                        continue
+                    delay = (self._queue[0][0] - datetime.now()).total_seconds()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if not self._running:
+                    return
+                job = heapq.heappop(self._queue)[2]
+                self.current_job = job
+            self._changed()
+            try:
+                self.run_job(job)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(job, e)
+            finally:
+                self.current_job = None
+            if job.daily and not job.cancelled:
+                job.advance(datetime.now())
+                self.add(job)
+            else:
+                self._changed()
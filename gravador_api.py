@@ -0,0 +1,230 @@
+import hmac
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import gravador_catalog as catalog
+import gravador_core as core
+
+DEFAULT_PORT = 8765
+METER_RATE = 10  # Atualizações do medidor por segundo no stream /meter
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+# Função para listar as gravações terminadas numa pasta (mais recentes primeiro),
+# a partir do catálogo: não abre nenhum WAV
+def list_takes(folder):
+    return [dict(take, modified=take["mtime"]) for take in catalog.catalog_for(folder).takes()]
+
+
+# Função para verificar se o cabeçalho Host aponta para o próprio computador
+def is_loopback_host(host):
+    try:
+        return urlsplit("//" + host).hostname in LOOPBACK_HOSTS
+    except ValueError:
+        return False
+
+
+# Estado de um gravador em formato JSON
+def recorder_status(recorder, meter=None):
+    status = {"state": core.IDLE, "samples_recorded": 0, "seconds": 0.0}
+    if recorder is not None:
+        status.update(state=recorder.state, samples_recorded=recorder.samples_recorded,
+                      seconds=recorder.samples_recorded / recorder.sample_rate,
+                      sample_rate=recorder.sample_rate, channels=recorder.channels,
+                      dtype=recorder.dtype)
+        if recorder.start_latency is not None:
+            status["start_latency_ms"] = round(recorder.start_latency * 1000, 1)
+    if meter is not None:
+        status.update(level_db=round(meter.level_db, 1), peak_db=round(meter.peak_db, 1), clips=meter.clips,
+                      gain_reduction_db=round(meter.gain_reduction_db, 1))
+    return status
+
+
+# Controlador sem interface gráfica: cria um gravador por gravação e salva-o ao
+# parar. Com standby o mesmo gravador fica armado entre gravações, com o
+# stream aberto, e /start só muda o ponto a partir do qual o áudio é guardado.
+class CoreController:
+    def __init__(self, make_recorder, folder, file_format=None, standby=False, on_saved=None):
+        self.make_recorder = make_recorder
+        self.folder = folder
+        self.file_format = file_format
+        self.standby = standby
+        self.on_saved = on_saved  # Chamado com o caminho de cada gravação salva
+        self.recorder = None
+        self.meter = core.LevelMeter()
+        self._lock = threading.Lock()
+
+    # Com standby abre já o stream, para o primeiro /start também ser imediato
+    def prepare(self):
+        with self._lock:
+            self._ensure_recorder()
+
+    def _ensure_recorder(self):
+        if not (self.standby and self.recorder is not None and self.recorder.armed):
+            self.recorder = self.make_recorder()
+            self.meter.limiter = self.recorder.limiter
+            self.recorder.monitors.append(self.meter)
+            if self.standby:
+                self.recorder.arm()
+
+    def start(self):
+        with self._lock:
+            if self.recorder is not None and self.recorder.is_recording:
+                raise RuntimeError("A gravação já está em andamento")
+            self._ensure_recorder()
+            self.recorder.start()
+        return self.status()
+
+    def pause(self):
+        with self._lock:
+            if self.recorder is None or not self.recorder.is_recording:
+                raise RuntimeError("Nenhuma gravação em andamento")
+            self.recorder.toggle_pause()
+        return self.status()
+
+    def stop(self):
+        with self._lock:
+            recorder = self.recorder
+            take = recorder.stop_take() if recorder is not None else None
+            if take is None:
+                raise RuntimeError("Nenhuma gravação em andamento")
+            frames, take_timeline, take_stats = take
+            self.meter.reset()
+            status = self.status()
+            status["stats"] = take_stats.as_dict()
+            if frames:
+                status["saved"] = catalog.save_take(self.folder, frames, recorder.sample_rate, recorder.channels,
+                                                    self.file_format, take_timeline, take_stats, self.on_saved)
+            else:
+                frames.close()
+        return status
+
+    def status(self):
+        return recorder_status(self.recorder, self.meter)
+
+    # Fecha o stream de um gravador armado
+    def close(self):
+        with self._lock:
+            if self.recorder is not None:
+                self.recorder.disarm()
+
+    def list_takes(self):
+        return list_takes(self.folder)
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    server_version = "GravadorAPI/1.0"
+
+    # Comandos aceites por POST e o método correspondente do controlador
+    commands = {"/start": "start", "/pause": "pause", "/stop": "stop"}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, code=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Só aceita pedidos dirigidos ao próprio computador (contra DNS rebinding);
+    # os comandos exigem ainda o token da sessão e não podem vir de uma página web
+    def authorized(self, command=False):
+        if not is_loopback_host(self.headers.get("Host", "")):
+            self.send_json({"error": "host não permitido"}, 403)
+            return False
+        if command and self.headers.get("Origin") is not None:
+            self.send_json({"error": "pedidos de páginas web não são aceites"}, 403)
+            return False
+        if command:
+            expected = f"Bearer {self.server.token}".encode("utf-8")
+            if not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), expected):
+                self.send_json({"error": "token inválido"}, 401)
+                return False
+        return True
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        controller = self.server.controller
+        if self.path == "/status":
+            self.send_json(controller.status())
+        elif self.path == "/takes":
+            self.send_json(controller.list_takes())
+        elif self.path == "/meter":
+            self.stream_meter()
+        else:
+            self.send_json({"error": "não encontrado"}, 404)
+
+    def do_POST(self):
+        if not self.authorized(command=True):
+            return
+        command = self.commands.get(self.path)
+        if command is None:
+            self.send_json({"error": "não encontrado"}, 404)
+            return
+        try:
+            self.send_json(getattr(self.server.controller, command)())
+        except RuntimeError as e:
+            self.send_json({"error": str(e)}, 409)
+        except Exception as e:
+            self.send_json({"error": str(e)}, 500)
+
+    # Stream de eventos (Server-Sent Events) com o estado e o nível a cada 1/METER_RATE s
+    def stream_meter(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        interval = 1.0 / self.server.meter_rate
+        next_time = time.monotonic()
+        try:
+            while not self.server.stopping.is_set():
+                event = json.dumps(self.server.controller.status())
+                self.wfile.write(f"data: {event}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                next_time += interval
+                self.server.stopping.wait(max(next_time - time.monotonic(), 0))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+# Servidor HTTP local (127.0.0.1) numa thread própria: nunca bloqueia a captura,
+# que corre na thread/callback da fonte de áudio. Os comandos POST levam o
+# token da sessão no cabeçalho "Authorization: Bearer <token>".
+class ControlServer:
+    def __init__(self, controller, host="127.0.0.1", port=DEFAULT_PORT, meter_rate=METER_RATE, token=None):
+        self.httpd = ThreadingHTTPServer((host, port), ControlRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.token = token or secrets.token_urlsafe(16)
+        self.httpd.controller = controller
+        self.httpd.meter_rate = meter_rate
+        self.httpd.stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    @property
+    def token(self):
+        return self.httpd.token
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
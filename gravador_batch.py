@@ -0,0 +1,243 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import gravador_catalog as catalog
+import gravador_export as export
+import gravador_peaks as peaks
+import gravador_stats as stats
+import gravador_wav as wavfile
+
+BATCH_WORKERS = os.cpu_count() or 1
+BATCH_CHUNK = 1 << 18  # Quadros lidos do original de cada vez
+OPERATIONS = ("normalize", "trim", "resample", "flac", "peaks")
+AUDIO_OPERATIONS = ("normalize", "trim", "resample")  # As que geram um WAV processado
+MANIFEST_NAME = ".lote.jsonl"
+DEFAULT_SETTINGS = {"normalize_db": -1.0, "silence_db": -50.0, "sample_rate": None}
+
+
+# Gravações de uma pasta (qualquer nome: recording_N, system_audio_N, gravacao_N...)
+def list_recordings(folder):
+    recordings = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and catalog.is_take_file(entry.name):
+            recordings.append(entry.path)
+    return sorted(recordings)
+
+
+def output_paths(filepath, output, operations):
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    paths = {}
+    if any(op in operations for op in AUDIO_OPERATIONS):
+        paths["wav"] = os.path.join(output, stem + ".wav")
+    if "flac" in operations:
+        paths["flac"] = os.path.join(output, stem + ".flac")
+    if "peaks" in operations:
+        paths["peaks"] = peaks.PeakCache.path_for(filepath)
+    return paths
+
+
+# Pico (normalizado) de um WAV a partir das estatísticas guardadas na gravação,
+# se ainda correspondem ao ficheiro; evita uma passagem de leitura
+def _known_peak(filepath, frames):
+    stored = stats.load_for(filepath)
+    if (stored is None or stored.get("frames") != frames
+            or os.path.getmtime(stats.path_for(filepath)) < os.path.getmtime(filepath)):
+        return None
+    return max(stored["peak"], default=None)
+
+
+# Uma passagem pelo ficheiro: pico e primeiro/último quadro acima do limiar de silêncio
+def _analyze(data, threshold):
+    peak = 0.0
+    first = last = None
+    for start in range(0, len(data), BATCH_CHUNK):
+        level = np.abs(wavfile.to_float(data[start:start + BATCH_CHUNK], np.float32)).max(axis=1)
+        peak = max(peak, float(level.max()) if len(level) else 0.0)
+        loud = np.flatnonzero(level >= threshold)
+        if loud.size:
+            first = start + int(loud[0]) if first is None else first
+            last = start + int(loud[-1]) + 1
+    return peak, first, last
+
+
+# Normaliza, corta o silêncio do início e do fim e reamostra num só WAV,
+# lendo o original por memmap em blocos
+def _process_audio(filepath, target, operations, settings):
+    info = wavfile.read_info(filepath)
+    data, sample_rate = wavfile.open_wav(filepath)
+    start, end = 0, len(data)
+    peak = _known_peak(filepath, len(data)) if "trim" not in operations else None
+    if "trim" in operations or ("normalize" in operations and peak is None):
+        peak, first, last = _analyze(data, 10 ** (settings["silence_db"] / 20))
+        if "trim" in operations:
+            start, end = (first, last) if first is not None else (0, 0)
+    gain = 1.0
+    if "normalize" in operations and peak:
+        gain = 10 ** (settings["normalize_db"] / 20) / peak
+    new_rate = settings["sample_rate"] if "resample" in operations and settings["sample_rate"] else sample_rate
+    resampler = export.Resampler(sample_rate, new_rate, info.channels) if new_rate != sample_rate else None
+    with wavfile.atomic_write(target) as temporary:
+        with wavfile.WavWriter(temporary, new_rate, info.channels, info.sample_format) as writer:
+            for chunk in range(start, end, BATCH_CHUNK):
+                block = np.asarray(data[chunk:min(chunk + BATCH_CHUNK, end)])
+                # Só cortar: as amostras são copiadas sem conversão
+                if gain != 1.0 or resampler is not None:
+                    block = wavfile.to_float(block) * gain
+                    if resampler is not None:
+                        block = resampler.process(block)
+                    block = np.clip(block, -1.0, 1.0)
+                writer.write(block)
+            if resampler is not None:
+                writer.write(np.clip(resampler.flush(), -1.0, 1.0))
+
+
+# Corre num processo do pool; devolve a duração do original em segundos
+def process_file(filepath, output, operations, settings):
+    info = wavfile.read_info(filepath)
+    paths = output_paths(filepath, output, operations)
+    if "wav" in paths:
+        _process_audio(filepath, paths["wav"], operations, settings)
+    if "flac" in paths:
+        source = paths.get("wav", filepath)
+        data, sample_rate = wavfile.open_wav(source)
+        with wavfile.atomic_write(paths["flac"]) as temporary:
+            export.export_flac(data, sample_rate, temporary, lambda fraction: None)
+    if "peaks" in paths:
+        data, _ = wavfile.open_wav(filepath)
+        peaks.PeakCache.for_file(filepath, data)
+    return info.frames / info.sample_rate
+
+
+class BatchResult:
+    def __init__(self):
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def files_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def audio_hours_per_second(self):
+        return self.audio_seconds / 3600 / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.processed} processados, {self.skipped} já atualizados, {self.failed} com erro em "
+                f"{self.elapsed:.1f} s: {self.files_per_second:.2f} ficheiros/s, "
+                f"{self.audio_hours_per_second:.3f} h de áudio/s")
+
+
+# Registo dos ficheiros já processados (na pasta de saída): permite retomar um
+# lote interrompido e saltar os ficheiros que não mudaram desde a última vez.
+# É um diário JSONL: a primeira linha tem as operações do lote e cada ficheiro
+# terminado acrescenta uma linha, sem reescrever as anteriores.
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.signature = None
+        self.entries = {}
+        self._lines = 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Última linha a meio de um lote interrompido
+                    if "operations" in record:
+                        self.signature = record["operations"]
+                        self.entries = {}
+                    elif "file" in record:
+                        self.entries[record["file"]] = record["source"]
+        except OSError:
+            pass
+
+    @staticmethod
+    def key(filepath):
+        stat = os.stat(filepath)
+        return [stat.st_mtime, stat.st_size]
+
+    # Prepara o diário para um lote; com outras operações os registos antigos deixam
+    # de valer. Só é reescrito (de forma atómica) se mudou ou tem linhas a mais.
+    def begin(self, signature):
+        if signature != self.signature:
+            self.signature = signature
+            self.entries = {}
+        if self._lines != len(self.entries) + 1:
+            with wavfile.atomic_write(self.path) as temporary, open(temporary, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"operations": signature}) + "\n")
+                for name, source in self.entries.items():
+                    f.write(json.dumps({"file": name, "source": source}) + "\n")
+            self._lines = len(self.entries) + 1
+
+    def is_current(self, filepath, paths):
+        return (self.entries.get(os.path.basename(filepath)) == self.key(filepath)
+                and all(os.path.exists(path) for path in paths.values()))
+
+    def record(self, filepath):
+        name = os.path.basename(filepath)
+        self.entries[name] = self.key(filepath)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"file": name, "source": self.entries[name]}) + "\n")
+        self._lines += 1
+
+
+# Processa todas as gravações de uma pasta num pool de processos. report é
+# chamado com (ficheiro, duração em segundos ou None, erro) a cada ficheiro.
+def run_batch(folder, operations, output=None, settings=None, workers=BATCH_WORKERS, report=None):
+    operations = [op for op in OPERATIONS if op in operations]
+    if not operations:
+        raise ValueError("Nenhuma operação escolhida")
+    if "flac" in operations and export.sf is None:
+        raise RuntimeError("O módulo soundfile não está instalado")
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    if "resample" in operations and not settings["sample_rate"]:
+        raise ValueError("A reamostragem precisa de uma taxa de amostragem")
+    output = output or os.path.join(folder, "processado")
+    if os.path.abspath(output) == os.path.abspath(folder):
+        raise ValueError("A pasta dos resultados não pode ser a das gravações")
+    os.makedirs(output, exist_ok=True)
+    signature = {"operations": operations, "settings": settings}
+    manifest = Manifest(os.path.join(output, MANIFEST_NAME))
+    manifest.begin(signature)
+    result = BatchResult()
+    pending = []
+    for filepath in list_recordings(folder):
+        if manifest.is_current(filepath, output_paths(filepath, output, operations)):
+            result.skipped += 1
+        else:
+            pending.append(filepath)
+    started = time.perf_counter()
+    if pending:
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(min(workers, len(pending)), mp_context=context)
+        try:
+            futures = {pool.submit(process_file, filepath, output, operations, settings): filepath
+                       for filepath in pending}
+            for future in as_completed(futures):
+                filepath = futures[future]
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    result.failed += 1
+                    if report is not None:
+                        report(filepath, None, e)
+                    continue
+                result.processed += 1
+                result.audio_seconds += seconds
+                manifest.record(filepath)
+                if report is not None:
+                    report(filepath, seconds, None)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import struct
+import threading
+
+import gravador_core as core
+import gravador_edits as editing
+import gravador_export as export
+import gravador_stats as stats
+import gravador_timeline as timeline
+import gravador_wav as wavfile
+
+CATALOG_NAME = ".gravacoes.sqlite"
+MEASURE_CHUNK = 1 << 18  # Quadros lidos de cada vez ao medir um WAV sem estatísticas
+COLUMNS = ("path", "name", "duration", "format", "channels", "sample_rate",
+           "peak_db", "rms_db", "created", "mtime", "size")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS takes (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    duration REAL NOT NULL,
+    format TEXT NOT NULL,
+    channels INTEGER NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    peak_db REAL,
+    rms_db REAL,
+    created REAL NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS takes_created ON takes (created);
+"""
+# Ficheiros gerados a partir de gravações (exportações, edições), que não são gravações
+DERIVED_SUFFIXES = tuple(suffix for _, suffix in export.EXPORT_FORMATS.values()
+                         if suffix.endswith(".wav")) + (editing.EDITED_SUFFIX,)
+
+
+def is_take_file(name):
+    name = name.lower()
+    return name.endswith(".wav") and not name.endswith(DERIVED_SUFFIXES)
+
+
+# Data de criação do ficheiro quando o sistema a tem; senão a da última escrita
+def created_time(stat):
+    if hasattr(stat, "st_birthtime"):
+        return stat.st_birthtime
+    return stat.st_ctime if os.name == "nt" else stat.st_mtime
+
+
+# Estatísticas de um WAV antigo, sem .stats.json: uma passagem pelo ficheiro,
+# com o mesmo cálculo da captura; o resultado fica guardado ao lado do WAV
+def measure(filepath):
+    data, sample_rate = wavfile.open_wav(filepath)
+    take_stats = stats.TakeStats(sample_rate, data.shape[1])
+    for start in range(0, len(data), MEASURE_CHUNK):
+        take_stats.add(wavfile.to_float(data[start:start + MEASURE_CHUNK]))
+    try:
+        stats.save_for(filepath, take_stats)
+    except OSError:
+        pass
+    return take_stats.as_dict()
+
+
+# Linha do catálogo de um WAV. Pico e RMS vêm das estatísticas da gravação
+# (take_stats ou .stats.json); só os WAV sem elas são lidos.
+def describe(filepath, take_stats=None, stat=None):
+    stat = stat or os.stat(filepath)
+    info = wavfile.read_info(filepath)
+    if take_stats is not None:
+        measured = take_stats.as_dict()
+    else:
+        measured = stats.load_for(filepath)
+        if measured is None or measured.get("frames") != info.frames:
+            measured = measure(filepath)
+    return (filepath, os.path.basename(filepath), info.frames / info.sample_rate, info.sample_format,
+            info.channels, info.sample_rate, measured["peak_db"], measured["rms_db"],
+            created_time(stat), stat.st_mtime, stat.st_size)
+
+
+# Índice SQLite das gravações de uma pasta (ficheiro .gravacoes.sqlite nela):
+# listar a biblioteca é uma consulta, sem abrir nenhum WAV. Atualizado quando
+# uma gravação termina (add) e posto em dia com a pasta por reconcile(), que
+# só volta a ler os ficheiros novos ou com mtime/tamanho diferentes.
+class Catalog:
+    def __init__(self, folder, path=None):
+        self.folder = folder
+        self.path = path or os.path.join(folder, CATALOG_NAME)
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _store(self, rows):
+        with self._lock, self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO takes ({', '.join(COLUMNS)}) "
+                                 f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+
+    def add(self, filepath, take_stats=None):
+        self._store([describe(os.path.abspath(filepath), take_stats)])
+
+    # Compara a pasta com o catálogo; devolve (novos ou alterados, removidos)
+    def reconcile(self):
+        with self._lock:
+            known = {path: (mtime, size) for path, mtime, size
+                     in self._db.execute("SELECT path, mtime, size FROM takes")}
+        changed = []
+        seen = set()
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not (entry.is_file() and is_take_file(entry.name)):
+                continue
+            seen.add(entry.path)
+            stat = entry.stat()
+            if known.get(entry.path) != (stat.st_mtime, stat.st_size):
+                try:
+                    changed.append(describe(entry.path, stat=stat))
+                except (OSError, ValueError, struct.error):
+                    seen.discard(entry.path)  # WAV inválido ou a ser escrito: fica de fora
+        removed = [(path,) for path in known if path not in seen]
+        self._store(changed)
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM takes WHERE path = ?", removed)
+        return len(changed), len(removed)
+
+    # Gravações da mais recente para a mais antiga, como dicionários
+    def takes(self):
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM takes ORDER BY created DESC").fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+# Catálogo partilhado de uma pasta (a interface, a API e a linha de comando usam o mesmo)
+def catalog_for(folder):
+    folder = os.path.abspath(folder)
+    with _catalogs_lock:
+        catalog = _catalogs.get(folder)
+        if catalog is None:
+            catalog = _catalogs[folder] = Catalog(folder)
+    return catalog
+
+
+# Salva uma gravação terminada num ficheiro novo da pasta: o WAV, ao lado o
+# índice temporal (.timeline) e as estatísticas (.stats.json), e junta-a ao
+# catálogo. Os blocos (FrameStore) são fechados depois de escritos e
+# on_saved(filepath) é chamado no fim (exportação). Devolve o caminho.
+def save_take(folder, frames, sample_rate, channels, file_format, take_timeline=None, take_stats=None,
+              on_saved=None):
+    os.makedirs(folder, exist_ok=True)
+    filepath = core.next_filename(folder)
+    try:
+        wavfile.save_wav(filepath, frames, sample_rate, channels, file_format)
+    finally:
+        frames.close()  # Apaga o ficheiro temporário dos blocos passados para o disco
+    timeline.save_for(filepath, take_timeline)
+    stats.save_for(filepath, take_stats)
+    catalog_for(folder).add(filepath, take_stats)
+    if on_saved is not None:
+        on_saved(filepath)
+    return filepath
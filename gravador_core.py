@@ -0,0 +1,1018 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import gravador_stats as stats
+import gravador_timeline as timeline
+
+# Backends de captura opcionais: cada versão do gravador usa um ou outro
+try:
+    import sounddevice as sd
+except ImportError:
+    sd = None
+
+try:
+    import soundcard as sc
+except ImportError:
+    sc = None
+
+# Estados do gravador
+IDLE = "idle"
+RECORDING = "recording"
+PAUSED = "paused"
+STANDBY = "standby"  # Stream aberto à espera, a encher o buffer de pré-gravação
+STOPPING = "stopping"  # Duração atingida, à espera que a fonte pare
+
+# Perfis de latência: tamanho do bloco (amostras) e latência pedida ao dispositivo
+LATENCY_PROFILES = {
+    "low": {"blocksize": 256, "latency": "low"},
+    "balanced": {"blocksize": 1024, "latency": None},
+    "power-saving": {"blocksize": 8192, "latency": "high"},
+}
+AUTO_PROFILE = "auto"
+AUTO_TUNE_BLOCKSIZES = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+_tuned_blocksizes = {}  # Resultado do ajuste automático por (backend, taxa, canais, dispositivo)
+
+# Formatos de amostra da captura e o valor de fundo de escala de cada um
+SAMPLE_FORMATS = {
+    "float32": 1.0,
+    "int16": 32768.0,
+    "int32": 2147483648.0,  # Dispositivos de 24 bits entregam int32 alinhado à esquerda
+}
+
+# O PortAudio não pode ser reinicializado com streams abertos: a reinicialização
+# e a abertura/fecho dos streams do sounddevice passam todas por este lock
+_portaudio_lock = threading.Lock()
+_portaudio_streams = 0  # Streams do sounddevice abertos neste processo
+
+
+# Função para converter um bloco float em [-1, 1] para o formato de captura.
+# A conta é feita em float64: em float32, 2**31 - 1 arredonda para 2**31 e as
+# amostras no fundo de escala dariam a volta para -2**31 ao converter para int32.
+def convert_block(block, dtype):
+    if dtype == "float32":
+        return block.astype(np.float32, copy=False)
+    scale = SAMPLE_FORMATS[dtype]
+    return np.clip(block.astype(np.float64) * scale, -scale, scale - 1).astype(dtype)
+
+
+# Função para reinicializar o PortAudio, que só vê dispositivos ligados depois
+# do arranque assim; não faz nada se houver streams abertos. Devolve True se reinicializou.
+def reinitialize_portaudio():
+    if sd is None:
+        raise RuntimeError("O módulo sounddevice não está instalado")
+    with _portaudio_lock:
+        if _portaudio_streams:
+            return False
+        sd._terminate()
+        sd._initialize()
+        return True
+
+
+# Nível médio de um bloco normalizado para [0, 1], qualquer que seja o formato
+def block_level(block):
+    scale = SAMPLE_FORMATS[block.dtype.name]
+    return float(np.abs(block.astype(np.float32, copy=False)).mean()) / scale
+
+
+# Nível RMS de um bloco em dBFS (todos os canais)
+def block_rms_db(block):
+    scale = SAMPLE_FORMATS[block.dtype.name]
+    samples = block.astype(np.float32, copy=False)
+    mean_square = float(np.dot(samples.ravel(), samples.ravel())) / max(samples.size, 1)
+    return 10 * np.log10(max(mean_square / (scale * scale), 1e-12))
+
+
+# Fonte de captura com sounddevice (microfone)
+class SoundDeviceSource:
+    def __init__(self, sample_rate=44100, channels=1, device=None, blocksize=0, latency=None,
+                 dtype="float32"):
+        if sd is None:
+            raise RuntimeError("O módulo sounddevice não está instalado")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.device = device
+        self.dtype = dtype
+        self.blocksize = blocksize
+        self.latency = latency
+        self.stream = None
+        self.xruns = 0  # Blocos perdidos por overflow do dispositivo
+
+    def start(self, on_block, on_error=None):
+        # O bloco aponta para o buffer do dispositivo: quem o guardar deve copiá-lo.
+        # O tempo do ADC é o relógio do dispositivo (alguns drivers devolvem 0).
+        def callback(indata, frame_count, time_info, status):
+            if status.input_overflow:
+                self.xruns += 1
+            device_time = time_info.inputBufferAdcTime or time_info.currentTime
+            on_block(indata, timeline.block_timing(device_time, dropout=bool(status.input_overflow)))
+
+        global _portaudio_streams
+        self.xruns = 0
+        with _portaudio_lock:
+            stream = sd.InputStream(samplerate=self.sample_rate, channels=self.channels,
+                                    device=self.device, blocksize=self.blocksize,
+                                    latency=self.latency, dtype=self.dtype, callback=callback)
+            try:
+                stream.start()
+            except Exception:
+                stream.close()
+                raise
+            self.stream = stream
+            _portaudio_streams += 1
+
+    # Em pausa o stream é parado: o callback deixa de ser chamado
+    def pause(self):
+        if self.stream is not None:
+            self.stream.stop()
+
+    def resume(self):
+        if self.stream is not None:
+            self.stream.start()
+
+    def stop(self):
+        global _portaudio_streams
+        if self.stream is not None:
+            with _portaudio_lock:
+                try:
+                    self.stream.stop()
+                    self.stream.close()
+                finally:
+                    self.stream = None
+                    _portaudio_streams -= 1
+
+
+# Fonte baseada numa thread de leitura (soundcard e fonte sintética)
+class ThreadedSource:
+    block_duration = 0.1  # Duração padrão de cada bloco em segundos
+
+    def __init__(self, sample_rate=44100, channels=1, blocksize=0, latency=None, dtype="float32"):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = blocksize or int(sample_rate * self.block_duration)
+        self.latency = latency
+        self._running = threading.Event()
+        self._active = threading.Event()
+        self._thread = None
+        self.error = None
+        self.xruns = 0  # Leituras que chegaram atrasadas mais de um bloco
+
+    def start(self, on_block, on_error=None):
+        self.xruns = 0
+        self._running.set()
+        self._active.set()
+        self._thread = threading.Thread(target=self._run, args=(on_block, on_error), daemon=True)
+        self._thread.start()
+
+    # Em pausa o stream é fechado e a thread fica bloqueada no evento; ao
+    # retomar abre-se de novo, para que o áudio que o backend guardaria
+    # durante a pausa não entre na gravação
+    def pause(self):
+        self._active.clear()
+
+    def resume(self):
+        self._active.set()
+
+    def stop(self):
+        self._running.clear()
+        self._active.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self, on_block, on_error):
+        try:
+            while self._running.is_set():
+                self._active.wait()
+                if not self._running.is_set():
+                    break
+                self._capture(on_block)
+        except Exception as e:
+            self.error = e
+            self._running.clear()
+            if on_error is not None:
+                on_error(e)
+
+    # Lê do stream até parar ou entrar em pausa
+    def _capture(self, on_block):
+        with self.open() as reader:
+            deadline = None
+            while self._running.is_set() and self._active.is_set():
+                block = self.read(reader)
+                now = time.monotonic()
+                # Uma leitura atrasada não perde dados (o backend guarda o áudio
+                # até ser lido): conta para o ajuste da latência, mas não é uma falha
+                if deadline is not None and now > deadline:
+                    self.xruns += 1
+                deadline = now + 2 * self.blocksize / self.sample_rate
+                if self._running.is_set() and self._active.is_set():
+                    on_block(block, timeline.block_timing())
+
+    def open(self):
+        raise NotImplementedError
+
+    def read(self, reader):
+        raise NotImplementedError
+
+
+# Fonte de captura com soundcard (áudio do sistema via loopback). Com um
+# microfone de loopback já resolvido (gravador_devices) abrir o stream não
+# volta a enumerar os dispositivos.
+class SoundCardSource(ThreadedSource):
+    def __init__(self, sample_rate=44100, channels=2, speaker=None, blocksize=0, latency=None,
+                 dtype="float32", microphone=None):
+        if sc is None:
+            raise RuntimeError("O módulo soundcard não está instalado")
+        super().__init__(sample_rate, channels, blocksize, latency, dtype)
+        self.speaker = speaker
+        self.microphone = microphone
+
+    def open(self):
+        mic = self.microphone
+        if mic is None:
+            speaker = self.speaker or sc.default_speaker()
+            mic = sc.get_microphone(id=str(speaker.name), include_loopback=True)
+        return mic.recorder(samplerate=self.sample_rate, channels=self.channels,
+                            blocksize=self.blocksize)
+
+    # O soundcard só entrega float: converte-se cada bloco logo à chegada
+    def read(self, reader):
+        return convert_block(reader.record(numframes=self.blocksize), self.dtype)
+
+
+# Fonte sintética (tom + ruído) para testes sem hardware de áudio
+class SyntheticSource(ThreadedSource):
+    def __init__(self, sample_rate=44100, channels=1, frequency=440.0, amplitude=0.5, realtime=True,
+                 blocksize=0, latency=None, dtype="float32"):
+        super().__init__(sample_rate, channels, blocksize, latency, dtype)
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.realtime = realtime
+        self.position = 0
+        self._rng = np.random.default_rng(0)
+
+    def open(self):
+        self._next_deadline = time.monotonic()
+        return _NullContext()
+
+    def read(self, reader):
+        n = np.arange(self.position, self.position + self.blocksize)
+        self.position += self.blocksize
+        tone = self.amplitude * np.sin(2 * np.pi * self.frequency * n / self.sample_rate)
+        noise = 0.01 * self._rng.standard_normal(self.blocksize)
+        block = convert_block(tone + noise, self.dtype)[:, None]
+        block = np.repeat(block, self.channels, axis=1)
+        if self.realtime:
+            self._next_deadline += self.blocksize / self.sample_rate
+            delay = self._next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return block
+
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# Fontes disponíveis e respetivo número de canais padrão
+BACKENDS = {
+    "soundcard": (SoundCardSource, 2),
+    "sounddevice": (SoundDeviceSource, 1),
+    "synthetic": (SyntheticSource, 1),
+}
+
+
+# Função para criar uma fonte com um perfil de latência
+def create_source(backend, sample_rate=44100, channels=None, profile="balanced", **options):
+    source_class, default_channels = BACKENDS[backend]
+    if channels is None:
+        channels = default_channels
+    if profile == AUTO_PROFILE:
+        blocksize = auto_tune_blocksize(backend, sample_rate, channels, **options)
+        settings = {"blocksize": blocksize, "latency": "low"}
+    else:
+        settings = LATENCY_PROFILES[profile]
+    return source_class(sample_rate=sample_rate, channels=channels, **settings, **options)
+
+
+# Mede quantos xruns uma fonte tem durante um curto período de captura
+def probe_source(source, duration=0.5):
+    source.start(lambda block, timing: None)
+    try:
+        time.sleep(duration)
+    finally:
+        source.stop()
+    if getattr(source, "error", None) is not None:
+        raise source.error
+    return source.xruns
+
+
+# Chave do ajuste automático: o dispositivo (e o formato) fazem parte dela,
+# cada dispositivo tem a sua latência
+def _tuning_key(backend, sample_rate, channels, options):
+    if channels is None:
+        channels = BACKENDS[backend][1]
+    device = tuple(sorted((name, getattr(value, "id", value)) for name, value in options.items()))
+    return backend, sample_rate, channels, device
+
+
+# Tamanho de bloco já medido para estas definições, ou None se ainda não foi
+def tuned_blocksize(backend, sample_rate=44100, channels=None, **options):
+    return _tuned_blocksizes.get(_tuning_key(backend, sample_rate, channels, options))
+
+
+# Procura o menor tamanho de bloco que funciona sem xruns nesta máquina.
+# Abre o dispositivo várias vezes (alguns segundos): a interface chama-a numa thread.
+def auto_tune_blocksize(backend, sample_rate=44100, channels=None, candidates=AUTO_TUNE_BLOCKSIZES,
+                        probe_duration=0.5, **options):
+    source_class, default_channels = BACKENDS[backend]
+    if channels is None:
+        channels = default_channels
+    key = _tuning_key(backend, sample_rate, channels, options)
+    if key in _tuned_blocksizes:
+        return _tuned_blocksizes[key]
+    result = candidates[-1]
+    for blocksize in candidates:
+        source = source_class(sample_rate=sample_rate, channels=channels, blocksize=blocksize,
+                              latency="low", **options)
+        try:
+            xruns = probe_source(source, probe_duration)
+        except Exception:
+            continue
+        if xruns == 0:
+            result = blocksize
+            break
+    _tuned_blocksizes[key] = result
+    return result
+
+
+# Buffer circular pré-alocado: guarda os últimos N quadros sem alocar por bloco
+class RingBuffer:
+    def __init__(self, capacity, channels, dtype="float32"):
+        self.data = np.zeros((capacity, channels), dtype=dtype)
+        self.capacity = capacity
+        self.position = 0  # Próxima posição de escrita
+        self.filled = 0
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def write(self, block):
+        n = len(block)
+        if n >= self.capacity:
+            self.data[:] = block[n - self.capacity:]
+            self.position = 0
+            self.filled = self.capacity
+            return
+        end = self.position + n
+        if end <= self.capacity:
+            self.data[self.position:end] = block
+        else:
+            split = self.capacity - self.position
+            self.data[self.position:] = block[:split]
+            self.data[:end - self.capacity] = block[split:]
+        self.position = end % self.capacity
+        self.filled = min(self.filled + n, self.capacity)
+
+    # Devolve uma cópia dos quadros guardados, do mais antigo para o mais recente
+    def read_all(self):
+        if self.filled < self.capacity:
+            return self.data[:self.filled].copy()
+        return np.concatenate((self.data[self.position:], self.data[:self.position]), axis=0)
+
+    def clear(self):
+        self.position = 0
+        self.filled = 0
+
+
+# Blocos de uma gravação, com limite de memória opcional: abaixo de
+# memory_limit (bytes) ficam em RAM; acima disso os mais antigos passam para
+# um ficheiro temporário e são lidos de volta por memmap. A escrita em disco
+# é feita por uma única thread, criada quando o limite é passado pela primeira
+# vez e acordada a cada bloco acima dele, nunca na thread de captura; close()
+# termina-a e apaga o ficheiro. Comporta-se como a
+# lista de blocos de antes (len, iteração, índice), por isso quem salva,
+# desenha ou analisa a gravação não muda.
+class FrameStore:
+    def __init__(self, channels, dtype="float32", memory_limit=None, folder=None):
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.memory_limit = memory_limit
+        self.folder = folder
+        self.ram_bytes = 0
+        self.spilled_frames = 0
+        self._blocks = []  # Arrays em RAM ou (primeiro quadro, quadros) no ficheiro
+        self._next_spill = 0  # Índice do bloco mais antigo ainda em RAM
+        self._file = None
+        self._map = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)  # Acorda a thread de escrita
+        self._thread = None
+        self._closed = False
+        self.error = None  # Erro de escrita no ficheiro temporário, se houve
+
+    @property
+    def spilled_bytes(self):
+        return self.spilled_frames * self.channels * self.dtype.itemsize
+
+    def append(self, block):
+        with self._lock:
+            self._blocks.append(block)
+            self.ram_bytes += block.nbytes
+            if self._over_limit():
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._spill, daemon=True)
+                    self._thread.start()
+                self._wake.notify()
+
+    # Com o lock: há blocos em RAM acima do limite
+    def _over_limit(self):
+        return (self.memory_limit is not None and self.ram_bytes > self.memory_limit
+                and self._next_spill < len(self._blocks))
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __getitem__(self, index):
+        with self._lock:
+            entry = self._blocks[index]
+        return entry if isinstance(entry, np.ndarray) else self._read(entry)
+
+    def __iter__(self):
+        with self._lock:
+            entries = list(self._blocks)
+        for entry in entries:
+            yield entry if isinstance(entry, np.ndarray) else self._read(entry)
+
+    def _read(self, entry):
+        start, frames = entry
+        data = self._map
+        if data is None or len(data) < start + frames:
+            with self._lock:
+                self._file.flush()
+                total = self.spilled_frames
+            data = self._map = np.memmap(self._file, dtype=self.dtype, mode='r', shape=(total, self.channels))
+        return data[start:start + frames]
+
+    # Thread de escrita: espera até a RAM passar o limite e passa os blocos
+    # mais antigos para o disco até voltar a ele
+    def _spill(self):
+        while True:
+            with self._lock:
+                while not self._closed and not self._over_limit():
+                    self._wake.wait()
+                if self._closed:
+                    return
+                index = self._next_spill
+                block = self._blocks[index]
+                start = self.spilled_frames
+            # Escrita fora do lock: a captura continua a acrescentar blocos.
+            # Se o disco falhar os blocos ficam em RAM, como sem limite.
+            try:
+                if self._file is None:
+                    self._file = tempfile.TemporaryFile(prefix="gravador-", dir=self.folder)
+                self._file.write(np.ascontiguousarray(block, dtype=self.dtype).data)
+            except OSError as e:
+                with self._lock:
+                    self.error = e
+                    self.memory_limit = None
+                return
+            with self._lock:
+                self._blocks[index] = (start, len(block))
+                self.spilled_frames += len(block)
+                self.ram_bytes -= block.nbytes
+                self._next_spill += 1
+
+    # Termina a thread de escrita e apaga o ficheiro temporário; depois disto
+    # os blocos que estavam no disco deixam de poder ser lidos
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self.memory_limit = None
+            self._wake.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Limitador com look-ahead (e AGC opcional) no caminho de captura. O áudio
+# sai atrasado `lookahead` segundos, o que lhe permite baixar o ganho antes
+# de um pico em vez de o cortar. O ganho necessário por amostra passa por um
+# mínimo deslizante (look-ahead + release) e uma média móvel (rampa de
+# ataque sem degraus), tudo vetorizado por bloco; a latência é fixa. Os zeros
+# com que a linha de atraso começa não saem (o primeiro bloco de um stream
+# fica `delay` quadros mais curto) e flush() devolve as amostras retidas no fim.
+# Com agc_target_db o ganho de entrada segue lentamente o nível RMS pedido.
+class Limiter:
+    def __init__(self, sample_rate, channels, ceiling_db=-1.0, lookahead=0.005, release=0.05,
+                 agc_target_db=None, agc_max_gain_db=20.0, agc_speed_db=3.0, agc_gate_db=-50.0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.ceiling = 10 ** (ceiling_db / 20)
+        self.delay = max(int(lookahead * sample_rate), 1)  # Latência em quadros
+        self.hold = max(int(release * sample_rate), self.delay)
+        self.agc_target_db = agc_target_db
+        self.agc_max_gain_db = agc_max_gain_db
+        self.agc_speed_db = agc_speed_db  # dB por segundo
+        self.agc_gate_db = agc_gate_db  # Abaixo disto (silêncio) o AGC não mexe no ganho
+        self.agc_gain_db = 0.0
+        self.gain_reduction_db = 0.0  # Maior redução do último bloco (negativa)
+        self.clipped = 0  # Amostras em clip na entrada do último bloco
+        self._required = np.ones(self.hold + self.delay)  # Ganho necessário das últimas amostras
+        self._delayed = np.zeros((self.delay, channels))
+        self._priming = self.delay  # Zeros ainda no início da linha de atraso
+        self._dropped = 0  # Zeros iniciais retirados do último bloco
+
+    @property
+    def latency(self):
+        return self.delay / self.sample_rate
+
+    def process(self, block):
+        scale = SAMPLE_FORMATS[block.dtype.name]
+        samples = block.astype(np.float64) / scale
+        magnitude = np.abs(samples).max(axis=1)
+        self.clipped = int(np.count_nonzero(np.abs(samples) >= stats.CLIP_LEVEL))
+        if self.agc_target_db is not None:
+            samples = self._agc(samples)
+            magnitude = np.abs(samples).max(axis=1)
+        required = np.minimum(self.ceiling / np.maximum(magnitude, 1e-12), 1.0)
+        history = np.concatenate((self._required, required))
+        self._required = history[len(required):]
+        held = sliding_min(history, self.hold + 1)  # len(block) + delay valores
+        window = self.delay + 1
+        total = np.concatenate(([0.0], np.cumsum(held)))
+        gain = (total[window:] - total[:-window]) / window
+        delayed = np.concatenate((self._delayed, samples))
+        self._delayed = delayed[len(samples):]
+        self._dropped = min(self._priming, len(samples))
+        self._priming -= self._dropped
+        out = delayed[self._dropped:len(samples)] * gain[self._dropped:, None]
+        self.gain_reduction_db = 20 * float(np.log10(gain.min())) if len(gain) else 0.0
+        if block.dtype.kind == 'f':
+            return out.astype(block.dtype)
+        return convert_block(out, block.dtype.name)
+
+    # Fim de uma gravação: devolve as amostras ainda na linha de atraso, com o
+    # ganho previsto até aí, e recomeça sem atraso como num stream novo. O
+    # histórico do ganho fica, porque num stream armado o áudio continua.
+    def flush(self, dtype="float32"):
+        required = self._required
+        out = self.process(np.zeros((self.delay, self.channels), dtype=dtype))
+        self._required = required
+        self._delayed = np.zeros((self.delay, self.channels))
+        self._priming = self.delay
+        return out
+
+    # Stream novo (aberto ou reaberto): sem atraso nem histórico do anterior
+    def reset(self):
+        self._required = np.ones(self.hold + self.delay)
+        self._delayed = np.zeros((self.delay, self.channels))
+        self._priming = self.delay
+
+    # Ganho do AGC: sobe ou desce no máximo agc_speed_db por segundo, em rampa
+    # ao longo do bloco; blocos de silêncio não o alteram
+    def _agc(self, samples):
+        start = self.agc_gain_db
+        rms = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+        level_db = 20 * np.log10(max(rms, 1e-12))
+        if level_db > self.agc_gate_db:
+            wanted = min(self.agc_target_db - level_db, self.agc_max_gain_db)
+            step = self.agc_speed_db * len(samples) / self.sample_rate
+            self.agc_gain_db = start + float(np.clip(wanted - start, -step, step))
+        ramp = np.linspace(start, self.agc_gain_db, len(samples), endpoint=False)
+        return samples * (10 ** (ramp / 20))[:, None]
+
+    # Atraso do limitador aplicado ao tempo de um bloco (o bloco de saída
+    # começa `delay` quadros antes do que entrou, menos os zeros retirados)
+    def shift_timing(self, timing):
+        if timing is None:
+            return timing
+        device_time, host_time, dropout = timing
+        shift = (self.delay - self._dropped) / self.sample_rate
+        if device_time is not None:
+            device_time -= shift
+        return device_time, host_time - shift, dropout
+
+
+# Máquina de estados do gravador: idle -> recording <-> paused -> idle.
+# Com pré-gravação (arm) o stream fica aberto no estado standby e os últimos
+# segundos ficam num buffer circular que abre a próxima gravação; sem
+# pré-gravação (preroll=0) o áudio em standby é descartado e iniciar/parar só
+# muda o ponto a partir do qual os blocos são guardados. start_latency mede o
+# tempo entre start() e a chegada da primeira amostra.
+# Cada gravação tem um índice temporal (timeline) com as falhas e pausas; com
+# fill_gaps as amostras perdidas são substituídas por silêncio, para a duração
+# do ficheiro corresponder ao tempo real.
+class Recorder:
+    def __init__(self, source, on_error=None, preroll=0.0, on_complete=None, fill_gaps=False,
+                 memory_limit=None, spill_folder=None, limiter=None):
+        self.source = source
+        self.on_error = on_error
+        self.on_complete = on_complete  # Chamado com a gravação (stop_take) quando uma com duração termina sozinha
+        self.listeners = []  # Funções chamadas com cada bloco gravado
+        self.monitors = []  # Funções chamadas com cada bloco recebido, mesmo em standby (não o guardam)
+        self.sample_rate = source.sample_rate
+        self.channels = source.channels
+        self.dtype = getattr(source, "dtype", "float32")
+        self.preroll = preroll  # Segundos mantidos em standby
+        self.preroll_buffer = None
+        self.armed = False
+        self.state = IDLE
+        self.memory_limit = memory_limit  # Bytes de áudio em RAM antes de passar para disco
+        self.spill_folder = spill_folder  # Pasta do ficheiro temporário (None = a do sistema)
+        self.frames = FrameStore(self.channels, self.dtype, memory_limit, spill_folder)
+        self.samples_recorded = 0
+        self.sample_limit = None  # Fim da gravação em amostras (duração fixa)
+        self.pause_marks = []  # Lista de (amostra, "pause"/"resume")
+        self.fill_gaps = fill_gaps
+        self.limiter = limiter  # Limiter opcional, aplicado a todos os blocos recebidos
+        self.timeline = None
+        self.stats = None  # Estatísticas da gravação, acumuladas bloco a bloco
+        self.start_latency = None  # Segundos entre start() e o primeiro bloco gravado
+        self._start_requested = None
+        self._start_time = None
+        self._trim_first = False
+        self._handed_off = False  # Se frames já foi entregue por stop_take() a quem a salva
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._stopped.set()
+
+    # Abre o stream em standby, a encher o buffer de pré-gravação
+    def arm(self):
+        with self._lock:
+            if self.state != IDLE:
+                raise RuntimeError("A gravação já está em andamento")
+            capacity = max(int(self.preroll * self.sample_rate), 1)  # Com preroll=0 nada é guardado
+            if self.preroll_buffer is None or self.preroll_buffer.capacity != capacity:
+                self.preroll_buffer = RingBuffer(capacity, self.channels, self.dtype)
+            self.preroll_buffer.clear()
+            if self.limiter is not None:
+                self.limiter.reset()
+            self.armed = True
+            self.state = STANDBY
+        try:
+            self.source.start(self._on_block, self._on_error)
+        except Exception:
+            with self._lock:
+                self.armed = False
+                self.state = IDLE
+            raise
+
+    def disarm(self):
+        with self._lock:
+            if not self.armed:
+                return
+            self.armed = False
+            if self.state != STANDBY:
+                return  # O stream fecha no fim da gravação em curso
+            self.state = IDLE
+        self.source.stop()
+
+    # Com duration a gravação termina exatamente após esse número de amostras
+    # (sem contar a pré-gravação), independentemente do relógio do sistema
+    def start(self, duration=None):
+        with self._lock:
+            if self.state not in (IDLE, STANDBY):
+                raise RuntimeError("A gravação já está em andamento")
+            # Uma gravação anterior que ninguém recebeu (terminada por um erro) é descartada
+            if not self._handed_off:
+                self.frames.close()
+            self.frames = FrameStore(self.channels, self.dtype, self.memory_limit, self.spill_folder)
+            self._handed_off = False
+            self.samples_recorded = 0
+            self.pause_marks = []
+            self.timeline = timeline.Timeline(self.sample_rate)
+            self.stats = stats.TakeStats(self.sample_rate, self.channels, SAMPLE_FORMATS[self.dtype])
+            self.start_latency = None
+            self._start_requested = time.perf_counter()
+            self._start_time = time.time()
+            self._stopped.clear()
+            was_standby = self.state == STANDBY
+            # Em standby sem pré-gravação o primeiro bloco começa antes de start()
+            self._trim_first = was_standby and self.preroll <= 0
+            if was_standby:
+                if self.preroll_buffer.filled:
+                    preroll = self.preroll_buffer.read_all()
+                    self.frames.append(preroll)
+                    self.stats.add(preroll)
+                    self.samples_recorded = self.preroll_buffer.filled
+                self.preroll_buffer.clear()
+            self.sample_limit = None
+            if duration:
+                self.sample_limit = self.samples_recorded + int(round(duration * self.sample_rate))
+            self.state = RECORDING
+            if was_standby:
+                return
+            if self.limiter is not None:
+                self.limiter.reset()
+        try:
+            self.source.start(self._on_block, self._on_error)
+        except Exception:
+            with self._lock:
+                self.state = IDLE
+                self._stopped.set()
+            raise
+
+    def _on_block(self, block, timing=None):
+        recorded = None
+        limit_reached = False
+        with self._lock:
+            # Com o lock: stop_take() pode esvaziar o atraso do limitador entre dois blocos
+            if self.limiter is not None:
+                block = self.limiter.process(block)
+                timing = self.limiter.shift_timing(timing)
+                if not len(block):
+                    return
+            if self.state == STANDBY:
+                if self.preroll > 0:
+                    self.preroll_buffer.write(block)
+            elif self.state == RECORDING:
+                if self.start_latency is None:
+                    self.start_latency = time.perf_counter() - self._start_requested
+                # Só a gravação perde o início do bloco; os monitores recebem-no inteiro
+                stored = block
+                if self._trim_first:
+                    stored, timing = self._trim_to_start(block, timing)
+                    self._trim_first = False
+                gap = self.timeline.add_block(self.samples_recorded, len(stored), timing, self.fill_gaps)
+                if gap and self.fill_gaps:
+                    if self.sample_limit is not None:
+                        gap = min(gap, self.sample_limit - self.samples_recorded)
+                    silence = np.zeros((gap, self.channels), dtype=block.dtype)
+                    self.frames.append(silence)
+                    self.stats.add(silence)
+                    self.samples_recorded += gap
+                recorded = stored
+                if self.sample_limit is not None:
+                    remaining = self.sample_limit - self.samples_recorded
+                    if remaining <= len(stored):
+                        recorded = stored[:remaining]
+                        limit_reached = True
+                # Blocos que apontam para memória do dispositivo são copiados
+                if not recorded.flags.owndata:
+                    recorded = recorded.copy()
+                self.frames.append(recorded)
+                self.stats.add(recorded)
+                self.samples_recorded += len(recorded)
+                if limit_reached:
+                    self.state = STOPPING
+        for monitor in self.monitors:
+            monitor(block)
+        if recorded is not None:
+            for listener in self.listeners:
+                listener(recorded)
+        # A fonte não pode ser parada a partir da sua própria thread/callback
+        if limit_reached:
+            threading.Thread(target=self._finish_timed, daemon=True).start()
+
+    # Corta o início do primeiro bloco depois de start() em standby: ficam só
+    # as amostras capturadas depois do pedido, estimadas pelo relógio do
+    # sistema no fim do bloco
+    def _trim_to_start(self, block, timing):
+        if timing is None:
+            return block, timing
+        device_time, host_time, dropout = timing
+        keep = int(round((host_time - self._start_time) * self.sample_rate))
+        if not 0 < keep < len(block):
+            return block, timing
+        cut = len(block) - keep
+        if device_time is not None:
+            device_time += cut / self.sample_rate
+        return block[cut:], (device_time, host_time, dropout)
+
+    def _finish_timed(self):
+        take = self.stop_take()
+        if take is not None and self.on_complete is not None:
+            self.on_complete(take)
+
+    def _on_error(self, error):
+        with self._lock:
+            self.state = IDLE
+            self.armed = False
+            # Uma gravação interrompida por um erro não é entregue a ninguém
+            discard = not self._handed_off
+            self._handed_off = True
+        if discard:
+            self.frames.close()
+        self._stopped.set()
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def pause(self):
+        with self._lock:
+            if self.state != RECORDING:
+                return False
+            self.state = PAUSED
+            self.pause_marks.append((self.samples_recorded, "pause"))
+            self.timeline.pause(self.samples_recorded)
+        self.source.pause()
+        return True
+
+    def resume(self):
+        with self._lock:
+            if self.state != PAUSED:
+                return False
+            self.state = RECORDING
+            self.pause_marks.append((self.samples_recorded, "resume"))
+            self.timeline.resume(self.samples_recorded)
+        self.source.resume()
+        return True
+
+    def toggle_pause(self):
+        if self.state == PAUSED:
+            self.resume()
+        else:
+            self.pause()
+        return self.state == PAUSED
+
+    # Termina a gravação; se estiver armado volta a standby com o stream aberto.
+    # Devolve True se foi esta chamada que terminou a gravação.
+    def stop(self):
+        return self.stop_take() is not None
+
+    # Como stop(), mas devolve a gravação terminada, (frames, timeline, stats),
+    # ou None se não foi esta chamada que a terminou. Armado, o gravador pode
+    # começar outra logo a seguir e substituir self.frames: quem salva usa isto.
+    def stop_take(self):
+        with self._lock:
+            if self.state in (IDLE, STANDBY):
+                return None
+            was_paused = self.state == PAUSED
+            tail = self._flush_limiter()
+            self.timeline.end(self.samples_recorded)
+            take = (self.frames, self.timeline, self.stats)
+            self._handed_off = True
+            self.state = STANDBY if self.armed else IDLE
+            keep_open = self.armed
+        if tail is not None:
+            for listener in self.listeners:
+                listener(tail)
+        try:
+            if not keep_open:
+                self.source.stop()
+            elif was_paused:
+                self.source.resume()
+        finally:
+            self._stopped.set()
+        return take
+
+    # Com o lock: junta à gravação as amostras ainda retidas no atraso do
+    # limitador; numa gravação com duração que já chegou ao fim ficam no stream
+    def _flush_limiter(self):
+        remaining = None if self.sample_limit is None else self.sample_limit - self.samples_recorded
+        if self.limiter is None or remaining == 0:
+            return None
+        tail = self.limiter.flush(self.dtype)[:remaining]
+        if not len(tail):
+            return None
+        self.frames.append(tail)
+        self.stats.add(tail)
+        self.samples_recorded += len(tail)
+        return tail
+
+    # Bloqueia até a gravação terminar (ou até o timeout)
+    def wait(self, timeout=None):
+        return self._stopped.wait(timeout)
+
+    @property
+    def is_recording(self):
+        return self.state in (RECORDING, PAUSED, STOPPING)
+
+    @property
+    def is_paused(self):
+        return self.state == PAUSED
+
+    @property
+    def error(self):
+        return getattr(self.source, "error", None)
+
+
+# Medidor de nível para usar como monitor do gravador: guarda o último nível
+# RMS e o pico (dBFS), lidos por outras threads (interface, API). Conta as
+# amostras em clip; com um limitador no gravador mostra também a redução de
+# ganho e os clips que ele viu na entrada (a saída dele já não os tem).
+class LevelMeter:
+    def __init__(self, limiter=None):
+        self.limiter = limiter
+        self.level_db = -120.0
+        self.peak_db = -120.0
+        self.clips = 0
+        self.gain_reduction_db = 0.0
+        self.blocks = 0
+
+    def __call__(self, block):
+        scale = SAMPLE_FORMATS[block.dtype.name]
+        self.level_db = block_rms_db(block)
+        peak = float(np.max(np.abs(block.astype(np.float32, copy=False)))) / scale if block.size else 0.0
+        self.peak_db = 20 * np.log10(max(peak, 1e-6))
+        if self.limiter is not None:
+            self.clips += self.limiter.clipped
+            self.gain_reduction_db = self.limiter.gain_reduction_db
+        elif peak >= stats.CLIP_LEVEL:
+            self.clips += count_clips(block)
+        self.blocks += 1
+
+    def reset(self):
+        self.level_db = -120.0
+        self.peak_db = -120.0
+        self.clips = 0
+        self.gain_reduction_db = 0.0
+
+
+# Amostras de um bloco no fundo de escala (ou acima, em float)
+def count_clips(block):
+    threshold = stats.CLIP_LEVEL * SAMPLE_FORMATS[block.dtype.name]
+    return int(np.count_nonzero(np.abs(block.astype(np.float32, copy=False)) >= threshold))
+
+
+# Mínimo de cada janela x[i:i + width] (algoritmo de van Herk/Gil-Werman):
+# mínimos acumulados dentro de blocos de `width`, em vez de um ciclo por janela
+def sliding_min(x, width):
+    count = len(x) - width + 1
+    padded = np.concatenate((x, np.full(-len(x) % width, np.inf)))
+    blocks = padded.reshape(-1, width)
+    forward = np.minimum.accumulate(blocks, axis=1).ravel()
+    backward = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(backward[:count], forward[width - 1:width - 1 + count])
+
+
+# Gravação por nível: com o gravador armado (a pré-gravação faz de
+# pré-disparo), começa uma gravação quando o nível passa threshold_db e
+# termina após `hold` segundos abaixo do limiar. Cada gravação é entregue a
+# on_take(frames, timeline, stats) e o gravador volta a standby à espera do próximo evento.
+# Só termina as gravações que ele próprio começou (não as manuais ou agendadas).
+class LevelTrigger:
+    def __init__(self, recorder, threshold_db=-30.0, hold=2.0, on_take=None, on_start=None):
+        self.recorder = recorder
+        self.threshold_db = threshold_db
+        self.hold_samples = int(hold * recorder.sample_rate)
+        self.on_take = on_take
+        self.on_start = on_start  # Chamado na thread de captura quando começa uma gravação
+        self.silent_samples = 0
+        self.takes = 0
+        self.level_db = -120.0
+        self.recording = False  # A gravação em curso foi começada pelo disparo
+        recorder.monitors.append(self.on_block)
+
+    def detach(self):
+        if self.on_block in self.recorder.monitors:
+            self.recorder.monitors.remove(self.on_block)
+
+    # Chamado na thread de captura: só muda o estado do gravador armado
+    def on_block(self, block):
+        self.level_db = block_rms_db(block)
+        state = self.recorder.state
+        if state == STANDBY:
+            self.recording = False  # A anterior terminou (também pelo botão Parar)
+            if self.level_db >= self.threshold_db:
+                self.silent_samples = 0
+                try:
+                    self.recorder.start()
+                except RuntimeError:
+                    return  # Uma gravação manual começou entretanto
+                self.recording = True
+                if self.on_start is not None:
+                    self.on_start()
+        elif state == RECORDING and self.recording:
+            if self.level_db >= self.threshold_db:
+                self.silent_samples = 0
+                return
+            self.silent_samples += len(block)
+            if self.silent_samples >= self.hold_samples:
+                self.finish()
+
+    # Termina a gravação começada pelo disparo, se houver, e entrega-a a on_take
+    def finish(self):
+        if not self.recording:
+            return False
+        self.recording = False
+        take = self.recorder.stop_take()
+        if take is None:
+            return False
+        self.takes += 1
+        if self.on_take is not None:
+            self.on_take(*take)
+        return True
+
+
+# Função para gerar nomes de arquivo sequenciais numa pasta
+def next_filename(folder, base_name="gravacao"):
+    counter = 1
+    while True:
+        filepath = os.path.join(folder, f"{base_name}_{counter}.wav")
+        if not os.path.exists(filepath):
+            return filepath
+        counter += 1
@@ -0,0 +1,169 @@
+import threading
+
+import gravador_core as core
+
+REFRESH_INTERVAL = 2.0  # Segundos entre verificações de dispositivos ligados/desligados
+SYNTHETIC_ID = "synthetic"
+
+
+# Um dispositivo de captura. O id é estável entre execuções (ao contrário dos
+# índices do PortAudio, que mudam quando se liga ou desliga um dispositivo);
+# handle é o objeto que a fonte usa para abrir o stream.
+class DeviceInfo:
+    def __init__(self, device_id, name, channels, is_default=False, handle=None):
+        self.id = device_id
+        self.name = name
+        self.channels = channels
+        self.is_default = is_default
+        self.handle = handle
+
+    @property
+    def label(self):
+        return f"{self.name} (padrão)" if self.is_default else self.name
+
+    def __repr__(self):
+        return f"{self.id}: {self.label}, {self.channels} canais"
+
+
+# soundcard: os microfones de loopback (um por saída de som), já resolvidos,
+# para a fonte não ter de voltar a enumerar os dispositivos ao abrir o stream
+def _enumerate_soundcard(reinitialize):
+    if core.sc is None:
+        raise RuntimeError("O módulo soundcard não está instalado")
+    try:
+        default_name = core.sc.default_speaker().name
+    except Exception:
+        default_name = None
+    return [DeviceInfo(str(mic.id), mic.name, mic.channels, mic.name == default_name, mic)
+            for mic in core.sc.all_microphones(include_loopback=True) if mic.isloopback]
+
+
+# sounddevice: o PortAudio só vê dispositivos novos depois de reinicializado
+# (core.reinitialize_portaudio, que não o faz com streams abertos)
+def _enumerate_sounddevice(reinitialize):
+    sd = core.sd
+    if sd is None:
+        raise RuntimeError("O módulo sounddevice não está instalado")
+    if reinitialize:
+        core.reinitialize_portaudio()
+    default_index = sd.default.device[0]
+    devices = []
+    for device in sd.query_devices():
+        if device["max_input_channels"] <= 0:
+            continue
+        hostapi = sd.query_hostapis(device["hostapi"])["name"]
+        devices.append(DeviceInfo(f"{hostapi}:{device['name']}", device["name"], device["max_input_channels"],
+                                  device["index"] == default_index, device["index"]))
+    return devices
+
+
+def _enumerate_synthetic(reinitialize):
+    return [DeviceInfo(SYNTHETIC_ID, "Tom de teste", 2, True)]
+
+
+ENUMERATORS = {
+    "soundcard": (_enumerate_soundcard, "microphone"),
+    "sounddevice": (_enumerate_sounddevice, "device"),
+    "synthetic": (_enumerate_synthetic, None),
+}
+
+
+# Lista de dispositivos de um backend, enumerada uma vez e mantida em cache.
+# Com start() uma thread volta a enumerar a cada REFRESH_INTERVAL segundos e
+# chama os listeners quando a lista muda (dispositivo ligado ou desligado).
+# Essa verificação nunca reinicializa o PortAudio: com sounddevice os
+# dispositivos novos só aparecem com refresh() explícito.
+class DeviceRegistry:
+    def __init__(self, backend, refresh_interval=REFRESH_INTERVAL):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+        self.listeners = []  # Funções chamadas (na thread de verificação) quando a lista muda
+        self._enumerate, self._option = ENUMERATORS[backend]
+        self._devices = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def devices(self):
+        with self._lock:
+            devices = self._devices
+        if devices is None:
+            self.refresh(reinitialize=False)
+            with self._lock:
+                devices = self._devices
+        return list(devices)
+
+    # Volta a enumerar; devolve True se a lista de dispositivos mudou
+    def refresh(self, reinitialize=True):
+        devices = self._enumerate(reinitialize)
+        with self._lock:
+            old = self._devices
+            self._devices = devices
+        changed = old is not None and [d.id for d in old] != [d.id for d in devices]
+        if changed:
+            for listener in list(self.listeners):
+                listener()
+        return changed
+
+    def find(self, device_id):
+        for device in self.devices:
+            if device.id == device_id:
+                return device
+        return None
+
+    def default(self):
+        devices = self.devices
+        for device in devices:
+            if device.is_default:
+                return device
+        return devices[0] if devices else None
+
+    # Argumentos para core.create_source que selecionam o dispositivo (None = padrão)
+    def source_options(self, device_id=None):
+        if device_id is None:
+            return {}
+        device = self.find(device_id)
+        if device is None:
+            raise ValueError(f"Dispositivo não encontrado: {device_id}")
+        return {self._option: device.handle} if self._option else {}
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh(reinitialize=False)
+            except Exception:
+                pass  # Falhas temporárias (ex.: servidor de som a reiniciar): tenta de novo
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+# Registo partilhado de um backend: a enumeração é feita uma vez por processo
+def registry_for(backend):
+    with _registries_lock:
+        registry = _registries.get(backend)
+        if registry is None:
+            registry = _registries[backend] = DeviceRegistry(backend)
+    return registry
+
+
+def stop_all():
+    with _registries_lock:
+        registries = list(_registries.values())
+    for registry in registries:
+        registry.stop()
@@ -0,0 +1,151 @@
+import json
+import os
+
+import numpy as np
+
+import gravador_wav as wavfile
+
+RENDER_CHUNK = 1 << 18  # Quadros copiados de cada vez ao exportar
+EDL_VERSION = 1
+EDITED_SUFFIX = ".editado.wav"  # Sufixo do WAV exportado com as edições aplicadas
+
+
+# Lista de edições não destrutivas de um WAV: o resultado é uma sequência de
+# segmentos (início e fim em quadros do original, ganho linear). Cortar ou
+# aparar só muda esta lista, por isso é instantâneo em qualquer ficheiro; o
+# áudio só é reescrito ao exportar (render). Guardada ao lado do WAV (.edl.json).
+class EditList:
+    def __init__(self, source_frames, segments=None):
+        self.source_frames = source_frames
+        self.segments = list(segments) if segments is not None else [(0, source_frames, 1.0)]
+        self.history = []  # Listas de segmentos anteriores, para desfazer
+
+    @staticmethod
+    def path_for(filepath):
+        return filepath + ".edl.json"
+
+    # Quadros do resultado
+    @property
+    def frames(self):
+        return sum(end - start for start, end, _ in self.segments)
+
+    @property
+    def is_identity(self):
+        return self.segments == [(0, self.source_frames, 1.0)]
+
+    # Garante que há um limite de segmento na posição `position` do resultado
+    # e devolve o índice do segmento que começa aí
+    def _split(self, position):
+        offset = 0
+        for i, (start, end, gain) in enumerate(self.segments):
+            length = end - start
+            if position == offset:
+                return i
+            if position < offset + length:
+                cut = start + position - offset
+                self.segments[i:i + 1] = [(start, cut, gain), (cut, end, gain)]
+                return i + 1
+            offset += length
+        return len(self.segments)
+
+    def _range(self, start, end):
+        start, end = max(int(start), 0), min(int(end), self.frames)
+        if end <= start:
+            raise ValueError("Seleção vazia")
+        self.history.append(list(self.segments))
+        first = self._split(start)
+        last = self._split(end)
+        return first, last
+
+    # Remove o intervalo [start, end) do resultado
+    def cut(self, start, end):
+        first, last = self._range(start, end)
+        del self.segments[first:last]
+
+    # Fica só com o intervalo [start, end)
+    def trim(self, start, end):
+        first, last = self._range(start, end)
+        self.segments = self.segments[first:last]
+
+    def gain(self, start, end, gain_db):
+        first, last = self._range(start, end)
+        factor = 10 ** (gain_db / 20)
+        for i in range(first, last):
+            s, e, g = self.segments[i]
+            self.segments[i] = (s, e, g * factor)
+
+    def undo(self):
+        if not self.history:
+            return False
+        self.segments = self.history.pop()
+        return True
+
+    # Segmentos que cobrem [start, end) do resultado, como
+    # (posição no resultado, início no original, fim no original, ganho)
+    def source_ranges(self, start, end):
+        offset = 0
+        for s, e, gain in self.segments:
+            length = e - s
+            lo, hi = max(start, offset), min(end, offset + length)
+            if lo < hi:
+                yield lo, s + lo - offset, s + hi - offset, gain
+            offset += length
+            if offset >= end:
+                break
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"version": EDL_VERSION, "source_frames": self.source_frames,
+                       "segments": [[s, e, g] for s, e, g in self.segments]}, f)
+
+    @classmethod
+    def load(cls, path, source_frames):
+        with open(path, encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get("source_frames") != source_frames:
+            raise ValueError("A lista de edições não corresponde ao ficheiro")
+        return cls(source_frames, [(int(s), int(e), float(g)) for s, e, g in stored["segments"]])
+
+
+# Função para carregar as edições de um WAV (None se não houver ou não servirem)
+def load_for(filepath, source_frames):
+    try:
+        return EditList.load(EditList.path_for(filepath), source_frames)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_for(filepath, edits):
+    path = EditList.path_for(filepath)
+    if edits is None or edits.is_identity:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    edits.save(path)
+
+
+def edited_target(filepath):
+    return os.path.splitext(filepath)[0] + EDITED_SUFFIX
+
+
+# Exporta o resultado das edições para um ficheiro novo, lendo o original por
+# memmap em blocos. Trechos sem ganho são copiados sem conversão.
+def render(filepath, edits, target=None, sample_format=None, report=None):
+    info = wavfile.read_info(filepath)
+    data, sample_rate = wavfile.open_wav(filepath)
+    target = target or edited_target(filepath)
+    sample_format = sample_format or info.sample_format
+    total = max(edits.frames, 1)
+    written = 0
+    with wavfile.atomic_write(target) as temporary:
+        with wavfile.WavWriter(temporary, sample_rate, info.channels, sample_format) as writer:
+            for _, src_start, src_end, gain in edits.source_ranges(0, edits.frames):
+                for start in range(src_start, src_end, RENDER_CHUNK):
+                    block = np.asarray(data[start:min(start + RENDER_CHUNK, src_end)])
+                    if gain != 1.0:
+                        block = np.clip(wavfile.to_float(block) * gain, -1.0, 1.0)
+                    writer.write(block)
+                    written += len(block)
+                    if report is not None:
+                        report(written / total)
+    return target
@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import gravador_wav as wavfile
+
+# soundfile é opcional: sem ele a exportação para FLAC não está disponível
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+EXPORT_WORKERS = max(min(2, (os.cpu_count() or 1) - 1), 1)  # Processos de exportação em paralelo
+EXPORT_CHUNK = 1 << 18  # Quadros lidos do original de cada vez
+PREVIEW_RATE = 16000  # Taxa da prévia reduzida
+RESAMPLE_HALF_TAPS = 32  # Metade do comprimento do filtro anti-aliasing
+PROGRESS_STEP = 0.05  # Progresso enviado à interface de 5 em 5 %
+
+
+# Reamostragem por blocos: filtro passa-baixo (sinc com janela de Blackman) e
+# interpolação linear, com estado entre blocos para ficheiros de qualquer tamanho
+class Resampler:
+    def __init__(self, sample_rate, new_rate, channels):
+        self.step = sample_rate / new_rate
+        self.channels = channels
+        cutoff = 0.45 * min(sample_rate, new_rate) / sample_rate
+        n = np.arange(-RESAMPLE_HALF_TAPS, RESAMPLE_HALF_TAPS + 1)
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(len(n))
+        self.taps = taps / taps.sum()
+        self.history = np.zeros((len(self.taps) - 1, channels))
+        self.buffer_start = -1  # Índice (filtrado) do primeiro quadro de self.last
+        self.last = np.zeros((1, channels))
+        self.position = float(RESAMPLE_HALF_TAPS)  # Compensa o atraso do filtro
+
+    def process(self, block):
+        samples = np.concatenate((self.history, block.astype(np.float64)), axis=0)
+        filtered = np.stack([np.convolve(samples[:, c], self.taps, mode="valid")
+                             for c in range(self.channels)], axis=1)
+        self.history = samples[len(samples) - len(self.history):]
+        buffer = np.concatenate((self.last, filtered), axis=0)
+        end = self.buffer_start + len(buffer) - 1  # Último índice disponível para interpolar
+        count = max(int(np.ceil((end - self.position) / self.step)), 0)
+        positions = self.position + self.step * np.arange(count) - self.buffer_start
+        index = positions.astype(np.int64)
+        frac = (positions - index)[:, None]
+        out = buffer[index] * (1 - frac) + buffer[index + 1] * frac
+        self.position += self.step * count
+        self.buffer_start = end
+        self.last = buffer[-1:]
+        return out
+
+    # Empurra zeros para tirar do filtro as últimas amostras
+    def flush(self):
+        return self.process(np.zeros((RESAMPLE_HALF_TAPS, self.channels)))
+
+
+# Cada encoder lê o original (memmap) em blocos e chama report(fração)
+def export_wav16(data, sample_rate, target, report):
+    with wavfile.WavWriter(target, sample_rate, data.shape[1], "int16") as writer:
+        for start in range(0, len(data), EXPORT_CHUNK):
+            writer.write(np.asarray(data[start:start + EXPORT_CHUNK]))
+            report((start + EXPORT_CHUNK) / len(data))
+
+
+def export_flac(data, sample_rate, target, report):
+    if sf is None:
+        raise RuntimeError("O módulo soundfile não está instalado")
+    subtype = "PCM_16" if data.dtype == np.int16 else "PCM_24"
+    with sf.SoundFile(target, 'w', samplerate=sample_rate, channels=data.shape[1],
+                      format="FLAC", subtype=subtype) as f:
+        for start in range(0, len(data), EXPORT_CHUNK):
+            f.write(np.asarray(data[start:start + EXPORT_CHUNK]))
+            report((start + EXPORT_CHUNK) / len(data))
+
+
+# Prévia leve: mono, PREVIEW_RATE Hz, 16 bits
+def export_preview(data, sample_rate, target, report):
+    resampler = Resampler(sample_rate, PREVIEW_RATE, 1)
+    with wavfile.WavWriter(target, PREVIEW_RATE, 1, "int16") as writer:
+        for start in range(0, len(data), EXPORT_CHUNK):
+            mono = wavfile.to_float(data[start:start + EXPORT_CHUNK]).mean(axis=1, keepdims=True)
+            writer.write(np.clip(resampler.process(mono), -1.0, 1.0))
+            report((start + EXPORT_CHUNK) / len(data))
+        writer.write(np.clip(resampler.flush(), -1.0, 1.0))
+
+
+# Formatos de exportação: encoder e sufixo do ficheiro gerado
+EXPORT_FORMATS = {
+    "wav16": (export_wav16, ".16bits.wav"),
+    "flac": (export_flac, ".flac"),
+    "preview": (export_preview, ".previa.wav"),
+}
+
+
+def export_target(filepath, name):
+    return os.path.splitext(filepath)[0] + EXPORT_FORMATS[name][1]
+
+
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+# Corre num processo do pool: abre o original como memmap (as páginas são
+# partilhadas pelo sistema entre os processos) e corre um encoder
+def _run_export(filepath, name, target):
+    data, sample_rate = wavfile.open_wav(filepath)
+    last = [0.0]
+
+    def report(fraction):
+        fraction = min(fraction, 1.0)
+        if fraction - last[0] >= PROGRESS_STEP or fraction >= 1.0:
+            last[0] = fraction
+            _progress_queue.put((filepath, name, fraction, None))
+
+    with wavfile.atomic_write(target) as temporary:
+        EXPORT_FORMATS[name][0](data, sample_rate, temporary, report)
+    return target
+
+
+# Exporta gravações terminadas para vários formatos num pool de processos,
+# no máximo max_workers de cada vez. submit() não bloqueia; on_progress é
+# chamado numa thread própria com (ficheiro, formato, fração, erro).
+class Exporter:
+    def __init__(self, max_workers=EXPORT_WORKERS, on_progress=None):
+        self.max_workers = max_workers
+        self.on_progress = on_progress
+        self._pool = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # O pool usa spawn: fazer fork de um processo com a interface e threads de
+    # áudio ativas não é seguro
+    def _ensure_pool(self):
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._queue = context.Queue()
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(self._queue,))
+            self._thread = threading.Thread(target=self._forward_progress, daemon=True)
+            self._thread.start()
+        return self._pool
+
+    def submit(self, filepath, formats):
+        futures = []
+        with self._lock:
+            pool = self._ensure_pool()
+            for name in formats:
+                future = pool.submit(_run_export, filepath, name, export_target(filepath, name))
+                future.add_done_callback(lambda f, name=name: self._on_done(filepath, name, f))
+                futures.append(future)
+        return futures
+
+    def _on_done(self, filepath, name, future):
+        error = None if future.cancelled() else future.exception()
+        if error is not None and self.on_progress is not None:
+            self.on_progress(filepath, name, 1.0, error)
+
+    def _forward_progress(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            if self.on_progress is not None:
+                self.on_progress(*message)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        pool.shutdown(wait=wait, cancel_futures=not wait)
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
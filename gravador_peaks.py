@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+PEAK_BIN = 256  # Amostras por intervalo no nível mais fino da cache de picos
+PEAK_FACTOR = 4  # Cada nível seguinte junta este número de intervalos
+PEAK_CHUNK = 1 << 20  # Quadros lidos de cada vez ao construir a cache
+PREVIEW_POINTS = 8192  # Amostras lidas para a pré-visualização, enquanto a cache é construída
+
+
+# Junta grupos de `factor` intervalos min/max (array (n, 2, canais)); o resto
+# que não completa um grupo forma um último intervalo
+def reduce_envelope(envelope, factor):
+    n = len(envelope) // factor * factor
+    grouped = envelope[:n].reshape(-1, factor, 2, envelope.shape[2])
+    reduced = np.stack((grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)), axis=1)
+    if n < len(envelope):
+        rest = envelope[n:]
+        tail = np.stack((rest[:, 0].min(axis=0), rest[:, 1].max(axis=0)))[None]
+        reduced = np.concatenate((reduced, tail), axis=0)
+    return reduced
+
+
+# Envelope min/max de amostras (quadros, canais) em intervalos de `size` quadros
+def samples_envelope(samples, size):
+    as_envelope = np.stack((samples, samples), axis=1)
+    return reduce_envelope(as_envelope, size) if size > 1 else as_envelope
+
+
+# Cache de picos em vários níveis de detalhe: o nível k tem intervalos de
+# PEAK_BIN * PEAK_FACTOR**k quadros. Guardada ao lado do WAV (.peaks.npz).
+class PeakCache:
+    def __init__(self, levels, base_bin=PEAK_BIN):
+        self.levels = levels  # Lista de arrays (intervalos, 2, canais)
+        self.base_bin = base_bin  # Quadros por intervalo no nível 0
+
+    @staticmethod
+    def path_for(filepath):
+        return filepath + ".peaks.npz"
+
+    def bin_size(self, level):
+        return self.base_bin * PEAK_FACTOR ** level
+
+    @classmethod
+    def _from_base(cls, base, base_bin=PEAK_BIN):
+        levels = [base]
+        while len(levels[-1]) > PEAK_FACTOR:
+            levels.append(reduce_envelope(levels[-1], PEAK_FACTOR))
+        return cls(levels, base_bin)
+
+    @classmethod
+    def build(cls, data):
+        chunk = PEAK_CHUNK // PEAK_BIN * PEAK_BIN
+        parts = []
+        for start in range(0, len(data), chunk):
+            parts.append(samples_envelope(np.asarray(data[start:start + chunk]), PEAK_BIN))
+        if parts:
+            base = np.concatenate(parts, axis=0)
+        else:
+            base = np.zeros((0, 2, data.shape[1]), dtype=data.dtype)
+        return cls._from_base(base)
+
+    # Pré-visualização imediata, com PREVIEW_POINTS amostras espaçadas em vez
+    # de percorrer o ficheiro: picos curtos entre elas não aparecem
+    @classmethod
+    def preview(cls, data):
+        step = max(len(data) // PREVIEW_POINTS, 1)
+        return cls._from_base(samples_envelope(np.asarray(data[::step]), 1), step)
+
+    # A cache guardada, se estiver atualizada; senão None
+    @classmethod
+    def load(cls, filepath):
+        cache_path = cls.path_for(filepath)
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(filepath):
+                with np.load(cache_path) as stored:
+                    return cls([stored[f"level_{i}"] for i in range(len(stored.files))])
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    # Carrega a cache do disco se estiver atualizada; senão constrói e guarda
+    @classmethod
+    def for_file(cls, filepath, data):
+        cache = cls.load(filepath)
+        if cache is not None:
+            return cache
+        cache = cls.build(data)
+        try:
+            np.savez(cls.path_for(filepath), **{f"level_{i}": level for i, level in enumerate(cache.levels)})
+        except OSError:
+            pass
+        return cache
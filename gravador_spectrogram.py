@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import gravador_wav as wavfile
+
+FFT_SIZE = 1024  # Amostras de cada janela da STFT
+MAX_COLUMNS = 8192  # Colunas guardadas na cache, qualquer que seja a duração
+WINDOWS_PER_BATCH = 4096  # Janelas numa rfft (~16 MB de float32 com FFT_SIZE 1024)
+PARALLEL_FRAMES = 30 * 60 * 48000  # A partir daqui (~30 min) o cálculo é dividido por processos
+MAX_WORKERS = 8  # Mais processos não compensam: a leitura do ficheiro passa a limitar
+SPECTROGRAM_WORKERS = min(os.cpu_count() or 1, MAX_WORKERS)
+FLOOR_DB = -120.0
+
+
+# Colunas [first, last) do espectrograma de um WAV, em dBFS (float16). Cada
+# coluna cobre `hop` quadros e é a média da potência de `per_column` janelas
+# de Hann espaçadas nesse intervalo. As janelas de um lote são vistas com
+# passo (sliding_window_view) sobre a mistura mono lida do memmap e passam
+# numa única rfft; cada lote tem no máximo WINDOWS_PER_BATCH janelas, seja
+# qual for a duração (em ficheiros longos cada coluna tem mais janelas).
+def compute_columns(filepath, first, last, hop, size=FFT_SIZE):
+    data, _ = wavfile.open_wav(filepath)
+    frames = len(data)
+    per_column = max(hop // (size // 2), 1)
+    step = hop // per_column
+    window = np.hanning(size).astype(np.float32)
+    norm = 4.0 / float(window.sum()) ** 2 / per_column  # Sinusoide de fundo de escala = 0 dB
+    out = np.full((last - first, size // 2 + 1), FLOOR_DB, dtype=np.float16)
+    columns_per_batch = max(WINDOWS_PER_BATCH // per_column, 1)
+    for batch in range(first, last, columns_per_batch):
+        batch_end = min(batch + columns_per_batch, last)
+        start = batch * hop
+        stop = min(batch_end * hop + size, frames)
+        if stop - start < size:
+            break
+        mono = wavfile.to_float(data[start:stop], np.float32).mean(axis=1)
+        # Janela k da coluna c começa em c * hop + k * step (relativo ao lote)
+        windows = np.lib.stride_tricks.sliding_window_view(mono, size)[::step]
+        count = min((batch_end - batch) * per_column, len(windows) // per_column * per_column)
+        if not count:
+            break
+        power = np.zeros((count // per_column, size // 2 + 1))
+        # Só com mais de WINDOWS_PER_BATCH janelas por coluna há várias rfft,
+        # e então o lote é uma única coluna
+        for chunk in range(0, count, WINDOWS_PER_BATCH):
+            spectrum = np.fft.rfft(windows[chunk:min(chunk + WINDOWS_PER_BATCH, count)] * window, axis=1)
+            chunk_power = spectrum.real ** 2 + spectrum.imag ** 2
+            if per_column > WINDOWS_PER_BATCH:
+                power[0] += chunk_power.sum(axis=0)
+            else:
+                power += chunk_power.reshape(-1, per_column, size // 2 + 1).sum(axis=1)
+        with np.errstate(divide="ignore"):
+            db = 10 * np.log10(power * norm)
+        columns = len(db)
+        out[batch - first:batch - first + columns] = np.maximum(db, FLOOR_DB)
+    return out
+
+
+# Espectrograma de um WAV inteiro, com resolução fixa (no máximo MAX_COLUMNS
+# colunas), guardado ao lado do WAV (.spectrogram.npz)
+class Spectrogram:
+    def __init__(self, db, sample_rate, hop, size=FFT_SIZE):
+        self.db = db  # (colunas, bins) em dBFS
+        self.sample_rate = sample_rate
+        self.hop = hop
+        self.size = size
+
+    @staticmethod
+    def path_for(filepath):
+        return filepath + ".spectrogram.npz"
+
+    @property
+    def duration(self):
+        return len(self.db) * self.hop / self.sample_rate
+
+    @classmethod
+    def build(cls, filepath, workers=SPECTROGRAM_WORKERS):
+        info = wavfile.read_info(filepath)
+        frames = info.frames
+        hop = max(FFT_SIZE // 2, -(-frames // MAX_COLUMNS))
+        hop = hop // (FFT_SIZE // 2) * (FFT_SIZE // 2)  # Múltiplo do passo das janelas
+        columns = frames // hop
+        workers = min(workers, MAX_WORKERS)
+        if workers <= 1 or frames < PARALLEL_FRAMES:
+            db = compute_columns(filepath, 0, columns, hop)
+        else:
+            bounds = np.linspace(0, columns, workers + 1).astype(int)
+            # spawn: o processo principal tem a interface e threads de áudio
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                parts = pool.map(compute_columns, [filepath] * workers, bounds[:-1], bounds[1:], [hop] * workers)
+                db = np.concatenate(list(parts), axis=0)
+        return cls(db, info.sample_rate, hop)
+
+    # Carrega a cache do disco se estiver atualizada; senão calcula e guarda
+    @classmethod
+    def for_file(cls, filepath, workers=SPECTROGRAM_WORKERS):
+        cache_path = cls.path_for(filepath)
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(filepath):
+                with np.load(cache_path) as stored:
+                    return cls(stored["db"], int(stored["sample_rate"]), int(stored["hop"]), int(stored["size"]))
+        except (OSError, ValueError, KeyError):
+            pass
+        spectrogram = cls.build(filepath, workers)
+        try:
+            np.savez(cache_path, db=spectrogram.db, sample_rate=spectrogram.sample_rate,
+                     hop=spectrogram.hop, size=spectrogram.size)
+        except OSError:
+            pass
+        return spectrogram
+
+    # Colunas do resultado de uma lista de edições (gravador_edits), montadas a
+    # partir das do original; o ganho de cada segmento soma-se em dB
+    def columns_for(self, edits=None):
+        if edits is None or edits.is_identity:
+            return self.db
+        parts = [np.zeros((0, self.db.shape[1]), dtype=self.db.dtype)]
+        for _, src_start, src_end, gain in edits.source_ranges(0, edits.frames):
+            segment = self.db[src_start // self.hop:src_end // self.hop]
+            if gain != 1.0:
+                segment = np.maximum(segment + np.float16(20 * np.log10(gain)), np.float16(FLOOR_DB))
+            parts.append(segment)
+        return np.concatenate(parts, axis=0)
@@ -0,0 +1,138 @@
+import json
+
+import numpy as np
+
+CLIP_LEVEL = 0.999  # Amostras a partir desta fração do fundo de escala contam como clip
+SEGMENT = 0.1  # Segundos de cada segmento de loudness (os blocos de 400 ms juntam 4)
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU abaixo da média dos blocos acima do limiar absoluto
+
+# Filtro K da ITU-R BS.1770 a 48 kHz: prateleira de agudos + passa-alto
+K_SHELF = ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585])
+K_HIGHPASS = ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])
+
+
+def _biquad_power(coefficients, frequencies):
+    b, a = coefficients
+    z = np.exp(-1j * 2 * np.pi * np.minimum(frequencies, 24000.0) / 48000.0)
+    return np.abs(np.polyval(b[::-1], z) / np.polyval(a[::-1], z)) ** 2
+
+
+# Pesos por bin de uma rfft de n amostras: |K(f)|² e o fator de Parseval, para
+# que a soma de |X|² * pesos seja o valor quadrático médio filtrado
+def k_weights(n, sample_rate):
+    frequencies = np.fft.rfftfreq(n, 1 / sample_rate)
+    weights = _biquad_power(K_SHELF, frequencies) * _biquad_power(K_HIGHPASS, frequencies)
+    weights[1:(n + 1) // 2] *= 2  # Bins que também aparecem com frequência negativa
+    return weights / (n * n)
+
+
+def to_db(value, floor=-120.0):
+    return max(20 * float(np.log10(value)), floor) if value > 0 else floor
+
+
+# Estatísticas de uma gravação acumuladas bloco a bloco, sem segunda passagem:
+# pico, RMS, offset DC e clips por canal, e loudness integrada (BS.1770, com
+# gating) a partir da energia filtrada de cada segmento de 100 ms.
+class TakeStats:
+    def __init__(self, sample_rate, channels, scale=1.0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.scale = scale  # Fundo de escala do formato das amostras
+        self.frames = 0
+        self.peak = np.zeros(channels)
+        self.sum = np.zeros(channels)
+        self.sum_squares = np.zeros(channels)
+        self.clips = np.zeros(channels, dtype=np.int64)
+        self.segment = max(int(SEGMENT * sample_rate), 1)
+        self.weights = k_weights(self.segment, sample_rate)
+        self.segment_powers = []  # Energia K (soma dos canais) de cada segmento
+        self._pending = np.zeros((0, channels))
+
+    def add(self, block):
+        if not len(block):
+            return
+        samples = block.astype(np.float64) / self.scale
+        magnitude = np.abs(samples)
+        self.frames += len(samples)
+        np.maximum(self.peak, magnitude.max(axis=0), out=self.peak)
+        self.sum += samples.sum(axis=0)
+        self.sum_squares += np.einsum('ij,ij->j', samples, samples)
+        self.clips += np.count_nonzero(magnitude >= CLIP_LEVEL, axis=0)
+
+        pending = np.concatenate((self._pending, samples), axis=0) if len(self._pending) else samples
+        count = len(pending) // self.segment
+        if count:
+            segments = pending[:count * self.segment].reshape(count, self.segment, self.channels)
+            spectrum = np.fft.rfft(segments, axis=1)
+            power = np.einsum('skc,k->s', np.abs(spectrum) ** 2, self.weights)
+            self.segment_powers.extend(power.tolist())
+        self._pending = pending[count * self.segment:].copy()
+
+    @property
+    def peak_db(self):
+        return to_db(float(self.peak.max()) if self.channels else 0.0)
+
+    @property
+    def rms_db(self):
+        if not self.frames:
+            return -120.0
+        return to_db(float(np.sqrt(self.sum_squares.sum() / (self.frames * self.channels))))
+
+    @property
+    def dc_offset(self):
+        return (self.sum / self.frames).tolist() if self.frames else [0.0] * self.channels
+
+    @property
+    def clip_count(self):
+        return int(self.clips.sum())
+
+    # Loudness integrada em LUFS: blocos de 400 ms com 75 % de sobreposição
+    # (4 segmentos), limiar absoluto e relativo; None se a gravação for curta
+    @property
+    def loudness(self):
+        powers = np.asarray(self.segment_powers)
+        if len(powers) < 4:
+            return None
+        blocks = np.convolve(powers, np.full(4, 0.25), mode="valid")
+        with np.errstate(divide="ignore"):
+            block_lufs = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[block_lufs > ABSOLUTE_GATE]
+        if not len(gated):
+            return None
+        relative = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+        gated = blocks[block_lufs > max(relative, ABSOLUTE_GATE)]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+    def as_dict(self):
+        return {"frames": self.frames, "duration": self.frames / self.sample_rate,
+                "peak_db": round(self.peak_db, 2), "rms_db": round(self.rms_db, 2),
+                "peak": [round(float(p), 6) for p in self.peak],
+                "dc_offset": [round(d, 6) for d in self.dc_offset],
+                "clips": self.clip_count,
+                "loudness_lufs": None if self.loudness is None else round(self.loudness, 2)}
+
+    def summary(self):
+        loudness = "—" if self.loudness is None else f"{self.loudness:.1f}"
+        dc = max(self.dc_offset, key=abs) if self.frames else 0.0
+        return (f"pico {self.peak_db:.1f} dBFS, RMS {self.rms_db:.1f} dBFS, {loudness} LUFS, "
+                f"{self.clip_count} clips, DC {dc:+.4f}")
+
+
+def path_for(filepath):
+    return filepath + ".stats.json"
+
+
+# Função para guardar as estatísticas ao lado de um WAV
+def save_for(filepath, stats):
+    if stats is not None and stats.frames:
+        with open(path_for(filepath), 'w', encoding='utf-8') as f:
+            json.dump(stats.as_dict(), f)
+
+
+def load_for(filepath):
+    try:
+        with open(path_for(filepath), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,204 @@
+import os
+import queue
+import socket
+import struct
+import threading
+
+import numpy as np
+
+DEFAULT_PORT = 8766
+QUEUE_BLOCKS = 64  # Blocos em fila por assinante antes de descartar
+
+# Cabeçalho enviado uma vez por ligação: magia, versão, taxa, canais, formato
+STREAM_HEADER = struct.Struct("<4sHIHH")
+STREAM_MAGIC = b"GPCM"
+STREAM_VERSION = 1
+# Cabeçalho de cada bloco: número de sequência, quadros, posição da 1ª amostra
+BLOCK_HEADER = struct.Struct("<IIQ")
+
+FORMAT_CODES = {"int16": 1, "int32": 2, "float32": 3}
+FORMAT_DTYPES = {code: dtype for dtype, code in FORMAT_CODES.items()}
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+
+
+# Um cliente ligado: fila limitada própria e uma thread que envia os blocos.
+# A captura só faz put_nowait, por isso um cliente lento perde blocos em vez
+# de atrasar a gravação.
+class Subscriber:
+    def __init__(self, conn, address, max_blocks=QUEUE_BLOCKS, policy=DROP_OLDEST):
+        self.conn = conn
+        self.address = address
+        self.policy = policy
+        self.queue = queue.Queue(maxsize=max_blocks)
+        self.dropped = 0
+        self.sent = 0
+        self.closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, header):
+        self.queue.put_nowait(header)
+        self._thread.start()
+
+    def offer(self, packet):
+        try:
+            self.queue.put_nowait(packet)
+            return
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.policy == DROP_NEWEST:
+            return
+        try:
+            self.queue.get_nowait()
+            self.queue.put_nowait(packet)
+        except (queue.Empty, queue.Full):
+            pass
+
+    def close(self):
+        self.closed.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+    def _run(self):
+        try:
+            while not self.closed.is_set():
+                packet = self.queue.get()
+                if packet is None:
+                    break
+                self.conn.sendall(packet)
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+
+# Distribui os blocos capturados a vários clientes locais (TCP em 127.0.0.1 ou
+# socket Unix) como PCM bruto. Usa-se como monitor do gravador.
+class PcmFanout:
+    def __init__(self, port=DEFAULT_PORT, unix_path=None, max_blocks=QUEUE_BLOCKS, policy=DROP_OLDEST):
+        self.port = port
+        self.unix_path = unix_path
+        self.max_blocks = max_blocks
+        self.policy = policy
+        self.subscribers = []
+        self.sequence = 0
+        self.position = 0
+        self.header = None
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.getsockname() if self._server is not None else None
+
+    def start(self):
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.remove(self.unix_path)
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._server.bind(self.unix_path)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind(("127.0.0.1", self.port))
+        self._server.listen()
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+    # Define o formato do áudio; se mudar, os clientes são desligados para
+    # voltarem a ligar e receberem o novo cabeçalho
+    def configure(self, sample_rate, channels, dtype):
+        header = STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, sample_rate, channels,
+                                    FORMAT_CODES[np.dtype(dtype).name])
+        with self._lock:
+            if header == self.header:
+                return
+            self.header = header
+            self.sequence = 0
+            self.position = 0
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def attach(self, recorder):
+        self.configure(recorder.sample_rate, recorder.channels, recorder.dtype)
+        recorder.monitors.append(self)
+
+    # Chamado na thread de captura: serializa uma vez e entrega sem bloquear
+    def __call__(self, block):
+        with self._lock:
+            if not self.subscribers:
+                self.position += len(block)
+                return
+            packet = BLOCK_HEADER.pack(self.sequence & 0xFFFFFFFF, len(block), self.position) + block.tobytes()
+            self.sequence += 1
+            self.position += len(block)
+            self.subscribers = [s for s in self.subscribers if not s.closed.is_set()]
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(packet)
+
+    def _accept_loop(self):
+        while self._server is not None:
+            try:
+                conn, address = self._server.accept()
+            except OSError:
+                break
+            with self._lock:
+                if self.header is None:
+                    conn.close()
+                    continue
+                subscriber = Subscriber(conn, address, self.max_blocks, self.policy)
+                subscriber.start(self.header)
+                self.subscribers.append(subscriber)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("Ligação terminada")
+        data.extend(chunk)
+    return bytes(data)
+
+
+# Cliente simples: gera (sequência, posição, bloco) a partir de um stream PCM
+def receive_blocks(address):
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        magic, version, sample_rate, channels, code = STREAM_HEADER.unpack(
+            _recv_exact(sock, STREAM_HEADER.size))
+        if magic != STREAM_MAGIC:
+            raise ValueError("Stream PCM inválido")
+        dtype = np.dtype(FORMAT_DTYPES[code])
+        try:
+            while True:
+                sequence, frames, position = BLOCK_HEADER.unpack(_recv_exact(sock, BLOCK_HEADER.size))
+                payload = _recv_exact(sock, frames * channels * dtype.itemsize)
+                yield sequence, position, np.frombuffer(payload, dtype=dtype).reshape(frames, channels)
+        except EOFError:
+            return
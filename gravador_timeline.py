@@ -0,0 +1,159 @@
+import struct
+import time
+
+import numpy as np
+
+# Índice temporal de uma gravação, guardado ao lado do WAV (.timeline):
+# cada entrada liga uma posição em amostras do ficheiro ao relógio do
+# dispositivo e ao relógio do sistema nesse instante. Só se guardam entradas
+# de referência a cada ANCHOR_INTERVAL segundos e nos eventos (falhas,
+# pausas), por isso uma hora de gravação ocupa poucos KB.
+TIMELINE_HEADER = struct.Struct("<4sHI")  # Magia, versão, taxa de amostragem
+TIMELINE_MAGIC = b"GTLN"
+TIMELINE_VERSION = 1
+ENTRY_DTYPE = np.dtype([
+    ("offset", "<u8"),  # Posição (quadros) da primeira amostra depois do evento
+    ("gap", "<u8"),  # Quadros perdidos imediatamente antes de offset
+    ("device_time", "<f8"),  # Relógio do dispositivo (s); NaN se a fonte não o tiver
+    ("host_time", "<f8"),  # Relógio do sistema (time.time())
+    ("flags", "<u2"),
+])
+
+ANCHOR_INTERVAL = 1.0  # Segundos entre entradas de referência
+
+# Marcas das entradas (combináveis)
+START = 1
+ANCHOR = 2
+DROPOUT = 4  # A fonte indicou perda de dados (overflow do dispositivo)
+GAP = 8  # Faltam amostras segundo o relógio
+FILLED = 16  # A falha foi preenchida com silêncio no ficheiro
+PAUSE = 32
+RESUME = 64
+END = 128
+
+FLAG_NAMES = {START: "início", ANCHOR: "referência", DROPOUT: "perda", GAP: "falha",
+              FILLED: "silêncio", PAUSE: "pausa", RESUME: "retoma", END: "fim"}
+
+
+# Tempo de um bloco entregue por uma fonte: relógio do dispositivo (ou None),
+# relógio do sistema e se a fonte indicou perda de dados antes deste bloco
+def block_timing(device_time=None, host_time=None, dropout=False):
+    return (device_time, time.time() if host_time is None else host_time, dropout)
+
+
+class Timeline:
+    def __init__(self, sample_rate, anchor_interval=ANCHOR_INTERVAL, entries=None):
+        self.sample_rate = sample_rate
+        self.anchor_frames = max(int(anchor_interval * sample_rate), 1)
+        self.entries = list(entries) if entries is not None else []
+        self.dropouts = 0
+        self.gap_frames = 0
+        self._last = None  # (fim esperado em quadros, tempo do dispositivo, tempo do sistema)
+        self._next_anchor = 0
+
+    @staticmethod
+    def path_for(filepath):
+        return filepath + ".timeline"
+
+    def mark(self, offset, flags, device_time=None, host_time=None, gap=0):
+        if host_time is None:
+            host_time = time.time()
+        self.entries.append((offset, gap, np.nan if device_time is None else device_time,
+                             host_time, flags))
+        if flags & (START | ANCHOR | GAP | RESUME):
+            self._next_anchor = offset + self.anchor_frames
+
+    # Regista um bloco de `frames` quadros que começa em `offset`. Devolve os
+    # quadros em falta antes dele: pelo relógio do dispositivo quando existe;
+    # sem ele, só quando a própria fonte indicou a perda (pelo relógio do
+    # sistema, que tem demasiado jitter para detetar falhas sozinho).
+    # Com fill=True a falha fica no ficheiro como silêncio e o bloco começa
+    # em offset + falha.
+    def add_block(self, offset, frames, timing=None, fill=False):
+        device_time, host_time, dropout = timing if timing is not None else block_timing()
+        gap = 0
+        flags = 0
+        if dropout:
+            flags |= DROPOUT
+            self.dropouts += 1
+        if self._last is None:
+            flags |= ANCHOR if self.entries else START
+        else:
+            expected_end, last_device, last_host = self._last
+            if device_time is not None and last_device is not None:
+                late = device_time - last_device - (offset - expected_end) / self.sample_rate
+            elif dropout:
+                late = host_time - last_host - (offset - expected_end) / self.sample_rate
+            else:
+                late = 0.0
+            missing = int(round(late * self.sample_rate))
+            if missing > max(frames // 2, 1):
+                gap = missing
+                flags |= GAP | (FILLED if fill else 0)
+                self.gap_frames += gap
+        start = offset + gap if fill else offset
+        if flags or start >= self._next_anchor:
+            self.mark(start, flags or ANCHOR, device_time, host_time, gap)
+        # Instante em que deve chegar o bloco seguinte, se nada se perder
+        duration = frames / self.sample_rate
+        self._last = (start + frames, None if device_time is None else device_time + duration,
+                      host_time + duration)
+        return gap
+
+    # Depois de uma pausa o relógio salta: o próximo bloco recomeça a referência
+    def pause(self, offset):
+        self.mark(offset, PAUSE)
+        self._last = None
+
+    def resume(self, offset):
+        self.mark(offset, RESUME)
+        self._last = None
+
+    def end(self, offset):
+        self.mark(offset, END)
+
+    def as_array(self):
+        return np.array(self.entries, dtype=ENTRY_DTYPE)
+
+    # Entradas com falhas ou perdas, como (posição em segundos, quadros em falta, marcas)
+    def problems(self):
+        entries = self.as_array()
+        selected = entries[(entries["flags"] & (DROPOUT | GAP)) != 0]
+        return [(int(e["offset"]) / self.sample_rate, int(e["gap"]), int(e["flags"])) for e in selected]
+
+    # Relógio do sistema de uma amostra, interpolado a partir da entrada anterior
+    def host_time_at(self, offset):
+        entries = self.as_array()
+        if not len(entries):
+            return None
+        i = max(int(np.searchsorted(entries["offset"], offset, side="right")) - 1, 0)
+        return float(entries["host_time"][i]) + (offset - int(entries["offset"][i])) / self.sample_rate
+
+    # Resumo para mostrar ao utilizador; vazio se a gravação não tem falhas
+    def summary(self):
+        if not self.dropouts and not self.gap_frames:
+            return ""
+        return f"{self.dropouts} perdas, {self.gap_frames / self.sample_rate:.3f} s em falta"
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(TIMELINE_HEADER.pack(TIMELINE_MAGIC, TIMELINE_VERSION, self.sample_rate))
+            self.as_array().tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, version, sample_rate = TIMELINE_HEADER.unpack(f.read(TIMELINE_HEADER.size))
+            if magic != TIMELINE_MAGIC:
+                raise ValueError("Índice temporal inválido")
+            entries = np.fromfile(f, dtype=ENTRY_DTYPE)
+        timeline = cls(sample_rate, entries=[tuple(e) for e in entries.tolist()])
+        timeline.dropouts = int(np.count_nonzero(entries["flags"] & DROPOUT))
+        timeline.gap_frames = int(entries["gap"].sum())
+        return timeline
+
+
+# Função para guardar o índice temporal ao lado de um WAV
+def save_for(filepath, timeline):
+    if timeline is not None and timeline.entries:
+        timeline.save(Timeline.path_for(filepath))
@@ -0,0 +1,474 @@
+import time
+
+import numpy as np
+import tkinter as tk
+from tkinter import ttk
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.ticker import AutoLocator, ScalarFormatter
+from matplotlib.widgets import SpanSelector
+
+import gravador_core as core
+import gravador_peaks as peaks
+import gravador_wav as wavfile
+
+REDRAW_BUDGET = 0.05  # Tempo máximo de um redesenho, em segundos
+MAX_POINTS = 4000  # Pontos por canal enviados ao matplotlib, no máximo
+STACKED = "stacked"  # Um canal por faixa, empilhados
+OVERLAID = "overlaid"  # Todos os canais na mesma faixa
+SPECTRUM_SIZE = 4096  # Amostras de cada FFT do analisador
+SPECTRUM_RATE = 15  # Atualizações do analisador por segundo, no máximo
+SPECTRUM_CPU_SHARE = 0.1  # Fração de um núcleo que o analisador pode ocupar
+OCTAVE_CENTERS = (31.5, 63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+# rfft(out=) só existe a partir do NumPy 2.0; antes disso o espectro é
+# calculado num array novo e copiado para o buffer
+try:
+    np.fft.rfft(np.zeros(2), out=np.empty(2, dtype=np.complex128))
+    _rfft_has_out = True
+except TypeError:
+    _rfft_has_out = False
+
+
+# Fonte de dados do visualizador: memmap do WAV + cache de picos. Devolve o
+# envelope de um intervalo de tempo com no máximo `points` pontos, lendo só
+# o necessário, por isso o custo não depende do tamanho do ficheiro.
+# Com uma lista de edições (gravador_edits) mostra o resultado das edições,
+# montado a partir dos picos do original, sem reescrever o ficheiro.
+# Com peak_cache (ex.: uma pré-visualização) a cache do disco não é usada.
+class WaveformSource:
+    def __init__(self, filepath, edits=None, peak_cache=None):
+        self.filepath = filepath
+        self.data, self.sample_rate = wavfile.open_wav(filepath)
+        self.source_frames, self.channels = self.data.shape
+        self.peaks = peak_cache if peak_cache is not None else peaks.PeakCache.for_file(filepath, self.data)
+        self.edits = edits
+
+    @property
+    def frames(self):
+        return self.edits.frames if self.edits is not None else self.source_frames
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def envelope(self, t0, t1, points):
+        start = max(int(t0 * self.sample_rate), 0)
+        stop = min(int(np.ceil(t1 * self.sample_rate)), self.frames)
+        if stop <= start:
+            return np.zeros(0), np.zeros((0, 2, self.channels))
+        if self.edits is None:
+            return self.source_envelope(start, stop, points)
+        times, envelopes = [np.zeros(0)], [np.zeros((0, 2, self.channels))]
+        for position, src_start, src_end, gain in self.edits.source_ranges(start, stop):
+            seg_points = max(points * (src_end - src_start) // (stop - start), 1)
+            seg_times, seg_envelope = self.source_envelope(src_start, src_end, seg_points)
+            times.append(seg_times + (position - src_start) / self.sample_rate)
+            envelopes.append(seg_envelope.astype(np.float64) * gain)
+        return np.concatenate(times), np.concatenate(envelopes, axis=0)
+
+    # Envelope dos quadros [start, stop) do original
+    def source_envelope(self, start, stop, points):
+        per_point = max((stop - start) // max(points, 1), 1)
+        if per_point < peaks.PEAK_BIN or not self.peaks.levels[0].size:
+            envelope = peaks.samples_envelope(np.asarray(self.data[start:stop]), per_point)
+            bin_size = per_point
+            first = start
+        else:
+            level = 0
+            while level + 1 < len(self.peaks.levels) and self.peaks.bin_size(level + 1) <= per_point:
+                level += 1
+            size = self.peaks.bin_size(level)
+            first_bin, last_bin = start // size, -(-stop // size)
+            envelope = self.peaks.levels[level][first_bin:last_bin]
+            factor = max(len(envelope) // max(points, 1), 1)
+            if factor > 1:
+                envelope = peaks.reduce_envelope(envelope, factor)
+            bin_size = size * factor
+            first = first_bin * size
+        times = (first + np.arange(len(envelope)) * bin_size) / self.sample_rate
+        return times, envelope
+
+
+# Gráfico da forma de onda com uma única Figure e um único canvas para toda a
+# sessão: cada gravação só troca os dados da linha e os limites dos eixos.
+# A Figure é criada sem pyplot, que guardaria todas as figuras abertas.
+# A roda do rato faz zoom, a barra de deslocamento percorre o ficheiro e um
+# duplo clique volta à vista completa. Cada canal tem a sua linha, em faixas
+# empilhadas ou sobrepostas. Com um espectrograma (gravador_spectrogram)
+# mostra-o em vez das linhas, com a mesma navegação e seleção.
+class WaveformView:
+    def __init__(self, master, layout=STACKED):
+        self.figure = Figure(figsize=(8, 4))
+        self.ax = self.figure.add_subplot()
+        self.ax.set_title("Forma de Onda do Áudio")
+        self.ax.set_xlabel("Tempo (segundos)")
+        self.ax.set_ylabel("Amplitude")
+        self.lines = []
+        self.layout = layout
+        self.amplitude = 1.0
+        self.spectrogram = None
+        self.columns = None  # Colunas do espectrograma já com as edições aplicadas
+        self.image = None
+        self.figure.tight_layout()
+
+        self.source = None
+        self.view = (0.0, 1.0)
+        self.points = MAX_POINTS
+        self.last_redraw = 0.0
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.scrollbar = ttk.Scrollbar(master, orient=tk.HORIZONTAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.canvas.mpl_connect("scroll_event", self.on_wheel)
+        self.canvas.mpl_connect("button_press_event", self.on_click)
+
+        # Seleção de um trecho (arrastar com o botão esquerdo) para as edições
+        self.selection = None
+        self.selector = SpanSelector(self.ax, self.on_select, "horizontal", useblit=False,
+                                     interactive=True, props={"alpha": 0.2})
+
+    def show_file(self, filepath, edits=None, peak_cache=None):
+        self.source = WaveformSource(filepath, edits, peak_cache)
+        self.clear_selection()
+        self.remove_spectrogram()
+        self.measure_amplitude()
+        self.setup_lanes(self.source.channels)
+        self.set_view(0.0, self.source.duration)
+
+    # Troca a cache de picos do ficheiro mostrado (a pré-visualização pela
+    # completa), mantendo a vista, a seleção e o espectrograma
+    def set_peaks(self, peak_cache):
+        if self.source is None:
+            return
+        self.source.peaks = peak_cache
+        self.measure_amplitude()
+        if self.image is None:
+            self.setup_lanes(self.source.channels)
+        self.redraw()
+
+    # Escala pelo maior pico; serve tanto para inteiros como para float [-1, 1]
+    def measure_amplitude(self):
+        coarse = self.source.peaks.levels[-1]
+        self.amplitude = float(np.abs(coarse.astype(np.float64)).max()) if coarse.size else 0.0
+        self.amplitude = self.amplitude or 1.0
+
+    # Mostra o resultado de novas edições do mesmo ficheiro
+    def set_edits(self, edits):
+        if self.source is None:
+            return
+        self.source.edits = edits
+        self.clear_selection()
+        if self.image is not None:
+            self.columns = self.spectrogram.columns_for(edits)
+        t0, t1 = self.view
+        self.set_view(t0, t1)
+
+    def on_select(self, t0, t1):
+        self.selection = (t0, t1) if t1 > t0 else None
+
+    # Seleção em quadros do resultado mostrado
+    def selection_frames(self):
+        if self.selection is None or self.source is None:
+            return None
+        t0, t1 = self.selection
+        return int(round(t0 * self.source.sample_rate)), int(round(t1 * self.source.sample_rate))
+
+    def clear_selection(self):
+        self.selection = None
+        self.selector.clear()
+
+    # Passa a mostrar o espectrograma do ficheiro atual (None volta à forma de onda)
+    def show_spectrogram(self, spectrogram):
+        if spectrogram is None:
+            self.remove_spectrogram()
+            if self.source is not None:
+                self.setup_lanes(self.source.channels)
+                self.redraw()
+            return
+        if self.source is None:
+            return
+        self.remove_spectrogram()
+        self.spectrogram = spectrogram
+        self.columns = spectrogram.columns_for(self.source.edits)
+        self.image = self.ax.imshow(np.zeros((1, 1)), origin="lower", aspect="auto", cmap="magma",
+                                    vmin=-100, vmax=0, interpolation="nearest")
+        for line in self.lines:
+            line.set_visible(False)
+        self.ax.set_ylim(0, spectrogram.sample_rate / 2)
+        self.ax.yaxis.set_major_locator(AutoLocator())
+        self.ax.yaxis.set_major_formatter(ScalarFormatter())
+        self.ax.set_ylabel("Frequência (Hz)")
+        self.redraw()
+
+    def remove_spectrogram(self):
+        if self.image is None:
+            return
+        self.image.remove()
+        self.image = None
+        self.spectrogram = None
+        self.columns = None
+        for line in self.lines:
+            line.set_visible(True)
+        self.ax.set_ylabel("Amplitude")
+
+    def set_layout(self, layout):
+        self.layout = layout
+        if self.image is not None:
+            return
+        if self.source is not None:
+            self.setup_lanes(self.source.channels)
+            self.redraw()
+
+    # Reaproveita as linhas existentes; só cria ou remove as que faltam ou sobram
+    def setup_lanes(self, channels):
+        while len(self.lines) < channels:
+            line, = self.ax.plot([], [], linewidth=0.8)
+            self.lines.append(line)
+        while len(self.lines) > channels:
+            self.lines.pop().remove()
+        lanes = channels if self.layout == STACKED else 1
+        span = 2 * self.amplitude * 1.05
+        self.ax.set_ylim(-span / 2 - (lanes - 1) * span, span / 2)
+        if lanes > 1:
+            self.ax.set_yticks([-i * span for i in range(lanes)])
+            self.ax.set_yticklabels([f"Canal {i + 1}" for i in range(lanes)])
+        else:
+            self.ax.set_yticks(np.linspace(-self.amplitude, self.amplitude, 5))
+            self.ax.set_yticklabels([f"{tick:g}" for tick in np.linspace(-self.amplitude, self.amplitude, 5)])
+        self.figure.tight_layout()
+
+    def lane_offset(self, channel):
+        if self.layout != STACKED:
+            return 0.0
+        return -channel * 2 * self.amplitude * 1.05
+
+    def set_view(self, t0, t1):
+        if self.source is None:
+            return
+        duration = max(self.source.duration, 1e-3)
+        width = min(max(t1 - t0, 10 / self.source.sample_rate), duration)
+        t0 = min(max(t0, 0.0), duration - width)
+        self.view = (t0, t0 + width)
+        self.scrollbar.set(t0 / duration, (t0 + width) / duration)
+        self.redraw()
+
+    # Desenha o intervalo visível e ajusta o número de pontos ao tempo gasto
+    def redraw(self):
+        started = time.perf_counter()
+        t0, t1 = self.view
+        if self.image is not None:
+            self.update_image(t0, t1)
+            self.ax.set_xlim(t0, t1)
+            self.canvas.draw()
+            self.last_redraw = time.perf_counter() - started
+            return
+        points = min(self.points, max(self.canvas.get_tk_widget().winfo_width(), 100))
+        times, envelope = self.source.envelope(t0, t1, points)
+        x = np.repeat(times, 2)
+        # (intervalos, 2, canais) -> (canais, intervalos * 2): min e max alternados
+        y = envelope.astype(np.float64).transpose(2, 0, 1).reshape(envelope.shape[2], -1)
+        for channel, line in enumerate(self.lines):
+            line.set_data(x, y[channel] + self.lane_offset(channel))
+        self.ax.set_xlim(t0, t1)
+        self.canvas.draw()
+        self.last_redraw = time.perf_counter() - started
+        if self.last_redraw > REDRAW_BUDGET:
+            self.points = max(self.points // 2, 200)
+        elif self.last_redraw < REDRAW_BUDGET / 4:
+            self.points = min(self.points * 2, MAX_POINTS)
+
+    # A imagem recebe só as colunas visíveis, no máximo uma por pixel
+    def update_image(self, t0, t1):
+        seconds = self.spectrogram.hop / self.spectrogram.sample_rate
+        first = min(max(int(t0 / seconds), 0), max(len(self.columns) - 1, 0))
+        last = min(max(int(np.ceil(t1 / seconds)), first + 1), len(self.columns))
+        step = max((last - first) // max(self.canvas.get_tk_widget().winfo_width(), 100), 1)
+        self.image.set_data(self.columns[first:last:step].T)
+        self.image.set_extent((first * seconds, last * seconds, 0, self.spectrogram.sample_rate / 2))
+
+    def on_wheel(self, event):
+        if self.source is None or event.xdata is None:
+            return
+        t0, t1 = self.view
+        factor = 0.8 if event.button == "up" else 1.25
+        center = event.xdata
+        self.set_view(center - (center - t0) * factor, center + (t1 - center) * factor)
+
+    def on_scrollbar(self, action, value, unit=None):
+        if self.source is None:
+            return
+        t0, t1 = self.view
+        width = t1 - t0
+        if action == tk.MOVETO:
+            t0 = float(value) * self.source.duration
+        elif action == tk.SCROLL:
+            step = width * (0.9 if unit == tk.PAGES else 0.1)
+            t0 += int(value) * step
+        self.set_view(t0, t0 + width)
+
+    def on_click(self, event):
+        if event.dblclick and self.source is not None:
+            self.set_view(0.0, self.source.duration)
+
+    def clear(self):
+        self.source = None
+        self.clear_selection()
+        self.remove_spectrogram()
+        for line in self.lines:
+            line.set_data([], [])
+        self.canvas.draw_idle()
+
+
+# Espectro das amostras mais recentes da captura. Como monitor do gravador
+# (thread de captura) só copia a mistura mono para um buffer circular; o
+# cálculo (janela de Hann, rfft, dBFS por bin e por banda de oitava) é feito
+# em compute(), na thread da interface, sempre nos mesmos buffers.
+class SpectrumAnalyzer:
+    def __init__(self, size=SPECTRUM_SIZE, sample_rate=44100):
+        self.size = size
+        self.active = False  # Sem janela aberta os blocos não são copiados
+        self.window = np.hanning(size)
+        self.ring = np.zeros(size)
+        self.position = 0
+        self.frame = np.empty(size)
+        self.spectrum = np.empty(size // 2 + 1, dtype=np.complex128)
+        self.power = np.empty(size // 2 + 1)
+        self.level_db = np.full(size // 2 + 1, -120.0)
+        self._cumulative = np.zeros(size // 2 + 2)
+        # Escalas para dBFS: uma sinusoide de fundo de escala fica em 0 dB
+        self._line_scale = 4.0 / self.window.sum() ** 2
+        self._band_scale = 4.0 / (size * np.dot(self.window, self.window))
+        self.reset(sample_rate)
+
+    def reset(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frequencies = np.fft.rfftfreq(self.size, 1 / sample_rate)
+        nyquist = sample_rate / 2
+        self.band_centers = np.array([c for c in OCTAVE_CENTERS if c * np.sqrt(2) <= nyquist])
+        # Bins [lo, hi) de cada banda, como índices na soma acumulada da potência
+        self._band_lo = np.searchsorted(self.frequencies, self.band_centers / np.sqrt(2))
+        self._band_hi = np.maximum(np.searchsorted(self.frequencies, self.band_centers * np.sqrt(2)),
+                                   self._band_lo + 1)
+        self._band_tmp = np.empty(len(self.band_centers))
+        self.band_db = np.full(len(self.band_centers), -120.0)
+        self.ring[:] = 0.0
+        self.position = 0
+
+    def __call__(self, block):
+        if not self.active or not len(block):
+            return
+        mono = block.mean(axis=1, dtype=np.float64)[-self.size:]
+        mono /= core.SAMPLE_FORMATS[block.dtype.name]
+        n = len(mono)
+        end = self.position + n
+        if end <= self.size:
+            self.ring[self.position:end] = mono
+        else:
+            split = self.size - self.position
+            self.ring[self.position:] = mono[:split]
+            self.ring[:end - self.size] = mono[split:]
+        self.position = end % self.size
+
+    def compute(self):
+        split = self.size - self.position
+        self.frame[:split] = self.ring[self.position:]
+        self.frame[split:] = self.ring[:self.position]
+        np.multiply(self.frame, self.window, out=self.frame)
+        if _rfft_has_out:
+            np.fft.rfft(self.frame, out=self.spectrum)
+        else:
+            self.spectrum[:] = np.fft.rfft(self.frame)
+        np.abs(self.spectrum, out=self.power)
+        np.square(self.power, out=self.power)
+        np.multiply(self.power, self._line_scale, out=self.level_db)
+        self._to_db(self.level_db)
+        np.cumsum(self.power, out=self._cumulative[1:])
+        np.take(self._cumulative, self._band_hi, out=self.band_db)
+        np.take(self._cumulative, self._band_lo, out=self._band_tmp)
+        np.subtract(self.band_db, self._band_tmp, out=self.band_db)
+        np.multiply(self.band_db, self._band_scale, out=self.band_db)
+        self._to_db(self.band_db)
+
+    @staticmethod
+    def _to_db(values):
+        np.maximum(values, 1e-12, out=values)
+        np.log10(values, out=values)
+        np.multiply(values, 10.0, out=values)
+
+
+# Janela do analisador: espectro (eixo de frequências logarítmico) e bandas de
+# oitava, redesenhados por blitting (só a linha e as barras). O intervalo entre
+# atualizações cresce se o cálculo e o desenho demorarem, para nunca passar
+# de cpu_share de um núcleo.
+class SpectrumView:
+    def __init__(self, master, analyzer, refresh_rate=SPECTRUM_RATE, cpu_share=SPECTRUM_CPU_SHARE):
+        self.analyzer = analyzer
+        self.refresh_rate = refresh_rate
+        self.cpu_share = cpu_share
+        self.last_update = 0.0  # Segundos gastos na última atualização
+        self.interval = 1.0 / refresh_rate
+        self._job = None
+        self._background = None
+
+        self.figure = Figure(figsize=(7, 4))
+        self.ax = self.figure.add_subplot(2, 1, 1)
+        self.ax.set_title("Espectro")
+        self.ax.set_xscale("log")
+        self.ax.set_xlim(20, analyzer.sample_rate / 2)
+        self.ax.set_ylim(-120, 0)
+        self.ax.set_ylabel("dBFS")
+        self.line, = self.ax.plot(analyzer.frequencies[1:], analyzer.level_db[1:], linewidth=0.8, animated=True)
+        self.bands_ax = self.figure.add_subplot(2, 1, 2)
+        self.bands_ax.set_ylim(-120, 0)
+        self.bands_ax.set_ylabel("dBFS")
+        positions = np.arange(len(analyzer.band_centers))
+        # Barras desenhadas a partir do fundo do eixo; a altura é o nível + 120
+        self.bars = self.bands_ax.bar(positions, np.zeros(len(positions)), bottom=-120, animated=True)
+        self.bands_ax.set_xticks(positions)
+        self.bands_ax.set_xticklabels([f"{c:g}" if c < 1000 else f"{c / 1000:g}k" for c in analyzer.band_centers])
+        self.bands_ax.set_xlabel("Bandas de oitava (Hz)")
+        self.figure.tight_layout()
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    # Depois de um desenho completo (ex.: redimensionar) guarda o fundo estático
+    def on_draw(self, event=None):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.ax.draw_artist(self.line)
+        for bar in self.bars:
+            self.bands_ax.draw_artist(bar)
+
+    def start(self):
+        self.analyzer.active = True
+        if self._job is None:
+            self._job = self.canvas.get_tk_widget().after(0, self.update)
+
+    def stop(self):
+        self.analyzer.active = False
+        if self._job is not None:
+            self.canvas.get_tk_widget().after_cancel(self._job)
+            self._job = None
+
+    def update(self):
+        started = time.perf_counter()
+        self.analyzer.compute()
+        self.line.set_ydata(self.analyzer.level_db[1:])
+        for bar, level in zip(self.bars, self.analyzer.band_db):
+            bar.set_height(level + 120)
+        if self._background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self.draw_artists()
+            self.canvas.blit(self.figure.bbox)
+        self.last_update = time.perf_counter() - started
+        # Ocupação = tempo gasto / período: o período nunca é menor que last_update / cpu_share
+        self.interval = max(1.0 / self.refresh_rate, self.last_update / self.cpu_share)
+        self._job = self.canvas.get_tk_widget().after(int((self.interval - self.last_update) * 1000), self.update)
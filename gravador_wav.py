@@ -0,0 +1,302 @@
+import contextlib
+import os
+import struct
+
+import numpy as np
+
+import gravador_core as core
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE  # Só lido: o formato real está no subformato
+RIFF_LIMIT = 0xFFFFFFFF  # Maior tamanho que cabe nos campos de 32 bits do RIFF
+SIZE_IN_DS64 = 0xFFFFFFFF  # Valor dos campos de 32 bits cujo tamanho real está no ds64
+WRITE_CHUNK_BYTES = 1 << 22  # Escritas grandes são feitas em partes de 4 MB
+CONVERT_CHUNK_FRAMES = 1 << 16  # Quadros convertidos de float de cada vez
+
+# Chunk JUNK reservado logo após o cabeçalho: se o ficheiro passar de 4 GB é
+# reescrito como ds64 (EBU Tech 3306) e o ficheiro passa a RF64
+DS64 = struct.Struct("<QQQI")
+FMT = struct.Struct("<HHIIHH")
+
+# Formatos de escrita: (etiqueta do chunk fmt, bits por amostra)
+FILE_FORMATS = {
+    "int16": (WAVE_FORMAT_PCM, 16),
+    "int24": (WAVE_FORMAT_PCM, 24),  # PCM de 24 bits compactado (3 bytes por amostra)
+    "int32": (WAVE_FORMAT_PCM, 32),
+    "float32": (WAVE_FORMAT_IEEE_FLOAT, 32),
+}
+
+
+# Função para converter amostras lidas de um WAV (float, int16 ou int32, também
+# uma fatia do memmap) para float em [-1, 1]
+def to_float(data, dtype=np.float64):
+    block = np.asarray(data)
+    return block.astype(dtype) / core.SAMPLE_FORMATS[block.dtype.name]
+
+
+# Escrita atómica: o conteúdo é escrito no caminho devolvido (target + ".part"),
+# que só substitui o destino se tudo correr bem; se falhar é apagado
+@contextlib.contextmanager
+def atomic_write(target):
+    temporary = target + ".part"
+    try:
+        yield temporary
+        os.replace(temporary, target)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+# Função para converter um bloco (float [-1, 1], int16 ou int32) para int32 de escala completa
+def to_int32(block):
+    if block.dtype == np.int32:
+        return block
+    if block.dtype == np.int16:
+        return block.astype(np.int32) << 16
+    return core.convert_block(block, "int32")
+
+
+# Função para converter um bloco para o formato de um ficheiro; int24 devolve
+# os 3 bytes mais significativos de cada amostra int32, sem ciclos em Python
+def encode_block(block, sample_format):
+    if sample_format == "float32":
+        if block.dtype.kind == 'f':
+            return block.astype(np.float32, copy=False)
+        return to_float(block, np.float32)
+    if sample_format == "int16":
+        if block.dtype == np.int16:
+            return block
+        if block.dtype == np.int32:
+            return (block >> 16).astype(np.int16)
+        return core.convert_block(block, "int16")
+    samples = to_int32(block)
+    if sample_format == "int32":
+        return samples
+    packed = np.ascontiguousarray(samples).view(np.uint8).reshape(-1, 4)[:, 1:]
+    return np.ascontiguousarray(packed)
+
+
+# Leitura de PCM de 24 bits compactado: comporta-se como um array (quadros,
+# canais) de int32 alinhado à esquerda, descompactando só as fatias pedidas
+class PackedInt24:
+    dtype = np.dtype(np.int32)
+
+    def __init__(self, raw, channels):
+        self.raw = raw.reshape(-1, channels, 3)
+        self.shape = self.raw.shape[:2]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        packed = self.raw[index]
+        unpacked = np.zeros(packed.shape[:-1] + (4,), dtype=np.uint8)
+        unpacked[..., 1:] = packed
+        return unpacked.view(np.int32)[..., 0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+
+# Escreve um WAV por blocos, sem conhecer o tamanho final. Enquanto o ficheiro
+# couber em 4 GB é um RIFF/WAVE normal; acima disso o cabeçalho é convertido
+# para RF64 ao fechar, sem reescrever os dados.
+class WavWriter:
+    def __init__(self, filepath, sample_rate, channels, sample_format="int16"):
+        self.filepath = filepath
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.format_tag, self.bits = FILE_FORMATS[sample_format]
+        self.block_align = channels * self.bits // 8
+        self.data_size = 0
+        self.file = open(filepath, 'wb')
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def frames(self):
+        return self.data_size // self.block_align
+
+    @property
+    def is_rf64(self):
+        return self._riff_size() > RIFF_LIMIT
+
+    def _riff_size(self):
+        return self.data_offset - 8 + self.data_size + (self.data_size & 1)
+
+    def _write_header(self):
+        f = self.file
+        f.write(struct.pack("<4sI4s", b"RIFF", 0, b"WAVE"))
+        f.write(struct.pack("<4sI", b"JUNK", DS64.size))
+        f.write(bytes(DS64.size))
+        f.write(struct.pack("<4sI", b"fmt ", FMT.size))
+        f.write(FMT.pack(self.format_tag, self.channels, self.sample_rate,
+                         self.sample_rate * self.block_align, self.block_align, self.bits))
+        # Formatos não-PCM levam um chunk fact com o número de quadros
+        self.fact_offset = None
+        if self.format_tag != WAVE_FORMAT_PCM:
+            f.write(struct.pack("<4sI", b"fact", 4))
+            self.fact_offset = f.tell()
+            f.write(struct.pack("<I", 0))
+        f.write(struct.pack("<4sI", b"data", 0))
+        self.data_offset = f.tell()
+
+    # Aceita blocos (quadros, canais) em float [-1, 1], int16 ou int32; os
+    # que já estão no formato do ficheiro são escritos sem conversão
+    def write(self, block):
+        for start in range(0, len(block), CONVERT_CHUNK_FRAMES):
+            chunk = block[start:start + CONVERT_CHUNK_FRAMES]
+            self._write_bytes(np.ascontiguousarray(encode_block(chunk, self.sample_format)))
+
+    def _write_bytes(self, array):
+        view = memoryview(array).cast('B')
+        for start in range(0, len(view), WRITE_CHUNK_BYTES):
+            part = view[start:start + WRITE_CHUNK_BYTES]
+            self.file.write(part)
+            self.data_size += len(part)
+
+    def close(self):
+        if self.file is None:
+            return
+        f = self.file
+        if self.data_size & 1:
+            f.write(b"\0")
+        if self.is_rf64:
+            f.seek(0)
+            f.write(struct.pack("<4sI", b"RF64", SIZE_IN_DS64))
+            f.seek(12)
+            f.write(struct.pack("<4sI", b"ds64", DS64.size))
+            f.write(DS64.pack(self._riff_size(), self.data_size, self.frames, 0))
+            f.seek(self.data_offset - 4)
+            f.write(struct.pack("<I", SIZE_IN_DS64))
+            if self.fact_offset is not None:
+                f.seek(self.fact_offset)
+                f.write(struct.pack("<I", SIZE_IN_DS64))
+        else:
+            f.seek(4)
+            f.write(struct.pack("<I", self._riff_size()))
+            f.seek(self.data_offset - 4)
+            f.write(struct.pack("<I", self.data_size))
+            if self.fact_offset is not None:
+                f.seek(self.fact_offset)
+                f.write(struct.pack("<I", self.frames))
+        f.close()
+        self.file = None
+
+
+# Parâmetros de um ficheiro WAV, RIFF ou RF64
+class WavInfo:
+    def __init__(self, format_tag, channels, sample_rate, bits, data_offset, data_size):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits = bits
+        self.data_offset = data_offset
+        self.data_size = data_size
+
+    @property
+    def block_align(self):
+        return self.channels * self.bits // 8
+
+    @property
+    def frames(self):
+        return self.data_size // self.block_align
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    @property
+    def sample_format(self):
+        for name, (format_tag, bits) in FILE_FORMATS.items():
+            if (format_tag, bits) == (self.format_tag, self.bits):
+                return name
+        raise ValueError(f"Formato WAV não suportado ({self.format_tag}, {self.bits} bits)")
+
+    # dtype das amostras lidas; int24 é entregue como int32 alinhado à esquerda
+    @property
+    def dtype(self):
+        return np.dtype({"int16": np.int16, "int24": np.int32, "int32": np.int32,
+                         "float32": np.float32}[self.sample_format])
+
+
+# Função para ler o cabeçalho de um WAV (RIFF ou RF64) sem ler os dados
+def read_info(filepath):
+    file_size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        riff, _, form = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or form != b"WAVE":
+            raise ValueError("Ficheiro WAV inválido")
+        ds64_data_size = None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("Ficheiro WAV sem dados")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"ds64":
+                _, ds64_data_size, _, _ = DS64.unpack(f.read(DS64.size))
+                f.seek(size - DS64.size, os.SEEK_CUR)
+            elif chunk_id == b"fmt ":
+                fmt = FMT.unpack(f.read(FMT.size))
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE and size >= 40:
+                    f.seek(8, os.SEEK_CUR)
+                    fmt = (struct.unpack("<H", f.read(2))[0],) + fmt[1:]
+                    f.seek(size - FMT.size - 10 + (size & 1), os.SEEK_CUR)
+                else:
+                    f.seek(size - FMT.size + (size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("Ficheiro WAV sem chunk fmt")
+                if riff == b"RF64" and size == SIZE_IN_DS64 and ds64_data_size is not None:
+                    size = ds64_data_size
+                offset = f.tell()
+                # Ficheiros interrompidos a meio da escrita: usa o que existe
+                size = min(size, file_size - offset)
+                format_tag, channels, sample_rate, _, _, bits = fmt
+                return WavInfo(format_tag, channels, sample_rate, bits, offset, size)
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+# Função para abrir um WAV como memmap (quadros, canais), sem o ler todo
+def open_wav(filepath):
+    info = read_info(filepath)
+    if info.frames == 0:
+        return np.zeros((0, info.channels), dtype=info.dtype), info.sample_rate
+    if info.sample_format == "int24":
+        raw = np.memmap(filepath, dtype=np.uint8, mode='r', offset=info.data_offset,
+                        shape=(info.frames * info.block_align,))
+        return PackedInt24(raw, info.channels), info.sample_rate
+    data = np.memmap(filepath, dtype=info.dtype, mode='r', offset=info.data_offset,
+                     shape=(info.frames, info.channels))
+    return data, info.sample_rate
+
+
+# Função para ler um WAV inteiro como array (quadros, canais)
+def read_wav(filepath):
+    data, sample_rate = open_wav(filepath)
+    return np.array(data), sample_rate
+
+
+# Função para salvar áudio num ficheiro WAV (RF64 automático acima de 4 GB).
+# Aceita um array ou a lista de blocos do gravador (evita concatenar tudo).
+# Sem sample_format, áudio int16/int32 é escrito tal como foi capturado e
+# float vai para 16 bits.
+def save_wav(filepath, audio_data, sample_rate, channels, sample_format=None):
+    blocks = [audio_data] if isinstance(audio_data, np.ndarray) else audio_data
+    if sample_format is None:
+        dtype = blocks[0].dtype.name if blocks else "int16"
+        sample_format = dtype if dtype in ("int16", "int32") else "int16"
+    with WavWriter(filepath, sample_rate, channels, sample_format) as writer:
+        for block in blocks:
+            writer.write(block)